@@ -0,0 +1,366 @@
+import gc
+thread = None
+try:
+    import _thread as thread
+except:
+    pass
+tracemalloc = None
+try:
+    import tracemalloc
+except:
+    pass
+
+from scheduler import Scheluder, Condition, Task, Message
+import common
+from common import ticks_ms, ticks_us, ticks_diff, sleep_ms
+
+# runs under CPython and on the board, every result is a tab separated row:
+#   benchmark  param  value  unit
+# so runs before and after a scheduler change can be diffed or loaded as a table
+# and the checks add a PASS or FAIL row
+
+
+def spinner(task, name, counter = None):
+    while True:
+        counter[0] += 1
+        yield task.sleep(0)
+
+
+def stopper(task, name, scheduler = None, duration = 1000):
+    yield Condition(sleep = duration)
+    scheduler.stop = True
+
+
+def sleeper(task, name, scheduler = None, receiver = None, warmup = 100, iterations = 1000, result = None):
+    msgs = [None]
+    i = 0
+    while True:
+        i += 1
+        if i == warmup:
+            result[0] = heap_used()
+        elif i == warmup + iterations:
+            result[1] = heap_used()
+            scheduler.stop = True
+        msgs[0] = scheduler.message(i, receiver)
+        yield task.sleep(0, msgs)
+
+
+def waiter(task, name):
+    while True:
+        yield task.wait()
+        task.get_message().release()
+
+
+def sender(task, name, scheduler = None, receiver = None):
+    msgs = [None]
+    i = 0
+    while True:
+        i += 1
+        msgs[0] = scheduler.message(i, receiver)
+        yield task.sleep(0, msgs)
+
+
+def receiver(task, name, counter = None):
+    while True:
+        yield task.wait()
+        while task.has_message():
+            task.get_message().release()
+            counter[0] += 1
+
+
+def parked(task, name):
+    while True:
+        yield task.wait()
+
+
+def heap_used():
+    # gc.mem_alloc() on the board, under CPython tracemalloc's traced memory, which only sees what is still held
+    # so it catches leaks and growing buffers rather than every short lived object
+    if hasattr(gc, "mem_alloc"):
+        return gc.mem_alloc()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def allocation_per_iteration(iterations = 1000):
+    # bytes allocated per scheduler step in steady state, with task.sleep() and pooled messages
+    tracing = not hasattr(gc, "mem_alloc")
+    if tracing and tracemalloc is None:
+        return None
+    s = Scheluder(name = "bench")
+    result = [0, 0]
+    waiter_id = s.add_task(Task(waiter, "waiter"))
+    s.add_task(Task(sleeper, "sleeper", kwargs = {"scheduler": s, "receiver": waiter_id, "iterations": iterations, "result": result}))
+    gc.collect()
+    gc.disable()
+    if tracing:
+        tracemalloc.start()
+    try:
+        s.run()
+    finally:
+        if tracing:
+            tracemalloc.stop()
+        gc.enable()
+    return (result[1] - result[0]) // iterations
+
+
+def periodic(task, name, interval = 50, counter = None):
+    while True:
+        counter[0] += 1
+        yield task.sleep(interval)
+
+
+def simulated_run(hours = 1, start_ms = (1 << 29) - 1800000):
+    # the firmware's task cadences on a virtual clock that starts half an hour before
+    # the 2**29 ms tick wraparound, deterministic and independent of host speed
+    clock = common.VirtualClock(start_ms)
+    common.set_clock(clock)
+    try:
+        duration = hours * 3600000
+        s = Scheluder(name = "bench")
+        intervals = (50, 25, 50, 500, 2000)
+        counters = []
+        for interval in intervals:
+            counter = [0]
+            counters.append(counter)
+            s.add_task(Task(periodic, "periodic-%s" % interval, kwargs = {"interval": interval, "counter": counter}))
+        s.add_task(Task(stopper, "stopper", kwargs = {"scheduler": s, "duration": duration}))
+        t = ticks_ms()
+        s.run()
+        elapsed = ticks_diff(ticks_ms(), t)
+        steps = []
+        for i in range(len(intervals)):
+            steps.append((intervals[i], counters[i][0], duration // intervals[i]))
+        return elapsed, clock.sleeps, steps
+    finally:
+        common.set_clock(None)
+
+
+def switches_per_second(tasks, duration = 2000):
+    gc.collect()
+    s = Scheluder(name = "bench")
+    counter = [0]
+    for i in range(tasks):
+        s.add_task(Task(spinner, "spinner-%s" % i, kwargs = {"counter": counter}))
+    s.add_task(Task(stopper, "stopper", kwargs = {"scheduler": s, "duration": duration}))
+    t = ticks_ms()
+    s.run()
+    elapsed = ticks_diff(ticks_ms(), t)
+    return counter[0] * 1000 // elapsed
+
+
+def messages_per_second(senders, duration = 2000):
+    # messages delivered through send_msgs, put_message and get_message, senders tasks into one receiver
+    gc.collect()
+    s = Scheluder(name = "bench", pool_size = senders + 16)
+    counter = [0]
+    receiver_id = s.add_task(Task(receiver, "receiver", kwargs = {"counter": counter}, mailbox_size = senders + 16))
+    for i in range(senders):
+        s.add_task(Task(sender, "sender-%s" % i, kwargs = {"scheduler": s, "receiver": receiver_id}))
+    s.add_task(Task(stopper, "stopper", kwargs = {"scheduler": s, "duration": duration}))
+    t = ticks_ms()
+    s.run()
+    elapsed = ticks_diff(ticks_ms(), t)
+    return counter[0] * 1000 // elapsed, s.tasks_ids[receiver_id].mailbox.dropped
+
+
+def loop_us(iterations):
+    # the bare loop, subtracted from the per-call costs below
+    t = ticks_us()
+    for _ in range(iterations):
+        pass
+    return ticks_diff(ticks_us(), t)
+
+
+def condition_ns(iterations = 10000):
+    # a new Condition per step against reset() of the task's own
+    gc.collect()
+    empty = loop_us(iterations)
+    t = ticks_us()
+    for _ in range(iterations):
+        Condition(sleep = 1)
+    created = ticks_diff(ticks_us(), t)
+    cond = Condition()
+    t = ticks_us()
+    for _ in range(iterations):
+        cond.reset(sleep = 1)
+    reset = ticks_diff(ticks_us(), t)
+    return (created - empty) * 1000 // iterations, (reset - empty) * 1000 // iterations
+
+
+def receive_ns(senders = 10, per_sender = 10, rounds = 100):
+    # get_message() in arrival order against get_message(sender) picking the last sender first
+    gc.collect()
+    task = Task(parked, "bench", mailbox_size = senders * per_sender)
+    msgs = []
+    for i in range(senders * per_sender):
+        msg = Message(i, sender = i % senders + 1)
+        msgs.append(msg)
+    results = []
+    for selective in (False, True):
+        total = 0
+        for _ in range(rounds):
+            for msg in msgs:
+                task.put_message(msg)
+            t = ticks_us()
+            if selective:
+                for sender_id in range(senders, 0, -1):
+                    while task.get_message(sender_id):
+                        pass
+            else:
+                while task.get_message():
+                    pass
+            total += ticks_diff(ticks_us(), t)
+        results.append(total * 1000 // (rounds * len(msgs)))
+    return results
+
+
+def ticks_ns(iterations = 10000):
+    # ticks_ms(), ticks_us() and ticks_diff() per call
+    gc.collect()
+    empty = loop_us(iterations)
+    results = []
+    for f in (ticks_ms, ticks_us):
+        t = ticks_us()
+        for _ in range(iterations):
+            f()
+        results.append((ticks_diff(ticks_us(), t) - empty) * 1000 // iterations)
+    a = ticks_ms()
+    t = ticks_us()
+    for _ in range(iterations):
+        ticks_diff(a, 1000)
+    results.append((ticks_diff(ticks_us(), t) - empty) * 1000 // iterations)
+    return results
+
+
+def pinger(task, name, scheduler = None, peer = None, receiver = None, rounds = 1000, result = None):
+    # a message to the other core and its echo back, one at a time
+    msgs = [None]
+    for i in range(rounds):
+        t = ticks_us()
+        msgs[0] = scheduler.message(i, receiver)
+        yield task.wait(True, 0, msgs)
+        msg = task.get_message()
+        if msg.content != i:
+            result[2] += 1
+        msg.release()
+        rtt = ticks_diff(ticks_us(), t)
+        result[0] += rtt
+        if rtt > result[1]:
+            result[1] = rtt
+    yield task.sleep(100) # the stream's last messages drain
+    peer.stop = True
+    scheduler.stop = True
+
+
+def echo(task, name, scheduler = None):
+    msgs = [None]
+    while True:
+        yield task.wait()
+        msg = task.get_message()
+        msgs[0] = scheduler.message(msg.content, msg.sender)
+        msg.release()
+        yield task.sleep(0, msgs)
+
+
+def streamer(task, name, scheduler = None, receiver = None, count = 2000, burst = 8, result = None):
+    # bursts from the other core like the mouse task's events into the HID writer
+    msgs = [None] * burst
+    n = 0
+    while n < count:
+        for i in range(burst):
+            msgs[i] = scheduler.message(n, receiver)
+            n += 1
+        yield task.sleep(1, msgs)
+        result[0] += burst
+    while True:
+        yield task.wait()
+
+
+def collector(task, name, result = None):
+    while True:
+        yield task.wait()
+        while task.has_message():
+            msg = task.get_message()
+            if msg.content <= result[3]: # a full channel drops some, the rest still come in order
+                result[2] += 1
+            result[3] = msg.content
+            result[1] += 1
+            msg.release()
+
+
+def cross_core(rounds = 1000, count = 2000, timeout_ms = 10000):
+    # two schedulers linked with connect(), the second one on its own thread (core 1 on rp2 MicroPython):
+    # round trips across, a one way stream, and every pooled message back in its pool afterwards
+    if thread is None:
+        return None
+    gc.collect()
+    s = Scheluder(name = "bench", pool_size = 16)
+    s1 = Scheluder(cpu = 1, name = "bench1", pool_size = 16)
+    s.connect(s1)
+    rtt = [0, 0, 0]
+    stream = [0, 0, 0, -1] # sent, received, out of order, last received
+    echo_id = s1.add_task(Task(echo, "echo", kwargs = {"scheduler": s1}))
+    collector_id = s.add_task(Task(collector, "collector", kwargs = {"result": stream}, mailbox_size = 32))
+    s1.add_task(Task(streamer, "streamer", kwargs = {"scheduler": s1, "receiver": collector_id, "count": count, "result": stream}))
+    collector_task = s.tasks_ids[collector_id]
+    s.add_task(Task(pinger, "pinger", kwargs = {"scheduler": s, "peer": s1, "receiver": echo_id, "rounds": rounds, "result": rtt}))
+    s.add_task(Task(stopper, "stopper", kwargs = {"scheduler": s, "duration": timeout_ms}))
+    s1.start_thread()
+    s.run()
+    s1.stop = True
+    sleep_ms(50) # the other thread sees stop within a wake check interval
+    dropped = s.inbox.queue.dropped + collector_task.mailbox.dropped
+    lost = stream[0] - stream[1] - dropped # neither delivered nor counted as dropped
+    leaked = (s.msg_pool.size - s.msg_pool.top) + (s1.msg_pool.size - s1.msg_pool.top)
+    return rtt[0] // rounds, rtt[1], rtt[2], stream[0], stream[1], dropped, stream[2], lost, leaked
+
+
+def emit(benchmark, param, value, unit):
+    print("%s\t%s\t%s\t%s" % (benchmark, param, value, unit))
+
+
+def main(sizes = (5, 20, 100), senders = (1, 10, 100), duration = 2000):
+    print("benchmark\tparam\tvalue\tunit")
+    for n in sizes:
+        emit("switches", "%d_tasks" % n, switches_per_second(n, duration), "per_s")
+    for n in senders:
+        delivered, dropped = messages_per_second(n, duration)
+        emit("messages", "%d_senders" % n, delivered, "per_s")
+        emit("messages_dropped", "%d_senders" % n, dropped, "msgs")
+    created, reset = condition_ns()
+    emit("condition", "new", created, "ns")
+    emit("condition", "reset", reset, "ns")
+    fifo, selective = receive_ns()
+    emit("receive", "fifo", fifo, "ns")
+    emit("receive", "by_sender", selective, "ns")
+    for name, ns in zip(("ticks_ms", "ticks_us", "ticks_diff"), ticks_ns()):
+        emit("ticks", name, ns, "ns")
+    elapsed, wakeups, steps = simulated_run()
+    emit("simulated_1h_wrap", "elapsed", elapsed, "ms")
+    emit("simulated_1h_wrap", "idle_wakeups", wakeups, "count")
+    for i in range(len(steps)):
+        interval, count, expected = steps[i]
+        emit("simulated_1h_wrap", "task%d_every_%d_ms" % (i, interval), count - expected, "steps_off")
+    result = cross_core()
+    if result is None:
+        emit("cross_core", "check", "na", "no_thread")
+    else:
+        rtt, max_rtt, wrong, sent, received, dropped, reordered, lost, leaked = result
+        emit("cross_core", "round_trip_avg", rtt, "us")
+        emit("cross_core", "round_trip_max", max_rtt, "us")
+        emit("cross_core", "stream_sent", sent, "msgs")
+        emit("cross_core", "stream_received", received, "msgs")
+        emit("cross_core", "stream_dropped", dropped, "msgs")
+        emit("cross_core", "pool_slots_leaked", leaked, "msgs")
+        ok = wrong == 0 and reordered == 0 and lost == 0 and leaked == 0 and received > 0
+        emit("cross_core", "check", "PASS" if ok else "FAIL", "verdict")
+    allocated = allocation_per_iteration()
+    if allocated is None:
+        emit("allocation", "check", "na", "no_heap_stats")
+    else:
+        emit("allocation", "per_iteration", allocated, "bytes")
+        emit("allocation", "check", "PASS" if allocated <= 0 else "FAIL", "verdict")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import os
+import json
+import struct
+from array import array
+
+from adafruit_hid.keycode import Keycode
+from adafruit_hid.consumer_control_code import ConsumerControlCode
+
+from keymap import Keymap, compile_keymap, consumer, momentary, toggle, one_shot, one_shot_layer, macro, tap_hold, FN
+from keymap import MOUSE_LEFT, MOUSE_RIGHT, MOUSE_UP, MOUSE_DOWN, MOUSE_MIDDLE
+
+# a board profile is a json file (pins, matrix and layers), compiled once into a binary cache beside it:
+#   header: magic, source size and mtime, rows, cols, layers, tap-holds, combos, flags, text length
+#   text: name, columns, rows, joystick and mouse button pins, a line each
+#   then the raw array("H") layer tables, tap, hold and timeout arrays, combo actions,
+#   combo key counts and the combo key indexes
+# the cache is reused while the source size and mtime match, so boot skips the json parse and keymap compile
+MAGIC = b"KBC2" # bump the last byte when the layout changes
+_HEADER = "<4sIIBBBBBBH"
+_BRIGHTNESS = 1
+
+MOUSE_KEYS = {
+    "MOUSE_LEFT": MOUSE_LEFT,
+    "MOUSE_RIGHT": MOUSE_RIGHT,
+    "MOUSE_UP": MOUSE_UP,
+    "MOUSE_DOWN": MOUSE_DOWN,
+    "MOUSE_MIDDLE": MOUSE_MIDDLE,
+}
+
+
+class BoardConfig(object):
+    def __init__(self, name, columns, rows, joystick, mouse_buttons, brightness, keymap):
+        self.name = name
+        self.columns = columns # pin names, driven
+        self.rows = rows # pin names, read with pull-ups
+        self.joystick = joystick # x and y adc pin names
+        self.mouse_buttons = mouse_buttons # left, right, wheel up and wheel down pin names, or none
+        self.brightness = brightness # backlight pwm and buttons fitted
+        self.keymap = keymap
+        self.row_gpios = None # gpio numbers for the single register row read
+        if all(pin.startswith("GP") for pin in rows):
+            self.row_gpios = tuple(int(pin[2:]) for pin in rows)
+
+
+def parse_action(key):
+    # "A", "FN", "MOUSE_LEFT", "consumer:VOLUME_INCREMENT", "momentary:2", "toggle:2", "one_shot:LEFT_SHIFT",
+    # "one_shot_layer:1", "macro:0", "tap_hold:ESCAPE|LEFT_CONTROL|200", null for transparent,
+    # a list for one action per layer
+    if key is None:
+        return None
+    if isinstance(key, list):
+        return tuple(parse_action(k) for k in key)
+    if key == "FN":
+        return FN
+    if key in MOUSE_KEYS:
+        return MOUSE_KEYS[key]
+    if ":" not in key:
+        return getattr(Keycode, key)
+    kind, arg = key.split(":", 1)
+    if kind == "consumer":
+        return consumer(getattr(ConsumerControlCode, arg))
+    if kind == "momentary":
+        return momentary(int(arg))
+    if kind == "toggle":
+        return toggle(int(arg))
+    if kind == "one_shot":
+        return one_shot(getattr(Keycode, arg))
+    if kind == "one_shot_layer":
+        return one_shot_layer(int(arg))
+    if kind == "macro":
+        return macro(int(arg))
+    if kind == "tap_hold":
+        parts = arg.split("|")
+        if len(parts) > 2:
+            return tap_hold(parse_action(parts[0]), parse_action(parts[1]), int(parts[2]))
+        return tap_hold(parse_action(parts[0]), parse_action(parts[1]))
+    raise ValueError("unknown key %s" % key)
+
+
+def compile_board(source):
+    with open(source) as f:
+        data = json.load(f)
+    keys = [[parse_action(key) for key in row] for row in data["keys"]]
+    combos = [([(y, x) for y, x in positions], parse_action(action)) for positions, action in data.get("combos", ())]
+    return BoardConfig(data["name"], data["columns"], data["rows"], data.get("joystick", ["A0", "A1"]),
+        data.get("mouse_buttons", []), data.get("brightness", False), compile_keymap(keys, combos))
+
+
+def source_stamp(source):
+    st = os.stat(source)
+    return st[6], int(st[8]) & 0xFFFFFFFF # size and mtime
+
+
+def read_cache(path, stamp):
+    # the cached profile, or None when missing, stale or from another format version
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        header = f.read(struct.calcsize(_HEADER))
+        if len(header) < struct.calcsize(_HEADER):
+            return None
+        magic, size, mtime, rows, cols, layers, ntap, ncombo, flags, text_size = struct.unpack(_HEADER, header)
+        if magic != MAGIC or (size, mtime) != stamp:
+            return None
+        lines = f.read(text_size).decode().split("\n")
+        tables = []
+        for _ in range(layers):
+            table = array("H", [0] * (rows * cols))
+            f.readinto(table)
+            tables.append(table)
+        tap = array("H", [0] * ntap)
+        hold = array("H", [0] * ntap)
+        timeout = array("H", [0] * ntap)
+        combo_action = array("H", [0] * ncombo)
+        for a in (tap, hold, timeout, combo_action):
+            if len(a):
+                f.readinto(a)
+        counts = f.read(ncombo)
+        combo_keys = [f.read(n) for n in counts]
+        keymap = Keymap(rows, cols, tables, tap, hold, timeout, [bytearray(keys) for keys in combo_keys], combo_action)
+        return BoardConfig(lines[0], lines[1].split(), lines[2].split(), lines[3].split(), lines[4].split(),
+            bool(flags & _BRIGHTNESS), keymap)
+
+
+def write_cache(path, stamp, config):
+    keymap = config.keymap
+    text = "\n".join((config.name, " ".join(config.columns), " ".join(config.rows),
+        " ".join(config.joystick), " ".join(config.mouse_buttons))).encode()
+    with open(path, "wb") as f:
+        f.write(struct.pack(_HEADER, MAGIC, stamp[0], stamp[1], keymap.rows, keymap.cols, len(keymap.tables),
+            len(keymap.tap), len(keymap.combo_keys), _BRIGHTNESS if config.brightness else 0, len(text)))
+        f.write(text)
+        for a in keymap.tables + [keymap.tap, keymap.hold, keymap.timeout, keymap.combo_action]:
+            if len(a):
+                f.write(a)
+        f.write(bytes(len(keys) for keys in keymap.combo_keys))
+        for keys in keymap.combo_keys:
+            f.write(keys)
+
+
+def load_board(source):
+    # board profile from its binary cache, compiled from the json source and cached when the source changed
+    cache = source.rsplit(".", 1)[0] + ".bin"
+    stamp = source_stamp(source)
+    config = read_cache(cache, stamp)
+    if config:
+        return config
+    config = compile_board(source)
+    try:
+        write_cache(cache, stamp, config)
+    except OSError as e: # CircuitPython's flash is read-only while mounted over usb, the next boot compiles again
+        print("board cache %s: %s" % (cache, e))
+        try:
+            os.remove(cache) # a half written cache must not match next time
+        except OSError:
+            pass
+    return config
@@ -1,6 +1,4 @@
 import os
-import gc
-import time
 import analogio
 import board
 import digitalio
@@ -21,17 +19,29 @@ try:
 except:
     print("no multi-threading module support")
 
-from adafruit_hid.keyboard import Keyboard
-from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
-from adafruit_hid.keycode import Keycode as K
 from adafruit_hid.mouse import Mouse
-from adafruit_hid.consumer_control import ConsumerControl
-from adafruit_hid.consumer_control_code import ConsumerControlCode as C
-
-from scheduler import Scheluder, Condition, Task, Message
-from common import ticks_ms, ticks_add, ticks_diff, sleep_ms
+from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
 
+from scheduler import Scheluder, Task, Cadence
+from keymap import KeymapEngine, MOUSE_LEFT, MOUSE_RIGHT, MOUSE_UP, MOUSE_DOWN, MOUSE_MIDDLE
+from board_config import load_board
+from matrix import MatrixScanner
+from debounce import Debouncer, EAGER
+from joystick import Joystick
+from hid_output import HidOutput, HidWriter, usb_ready
+from events import EventQueue, KEY_DOWN, KEY_UP, CONSUMER, BUTTON_DOWN, CLICK, MACRO
+from macro import MacroReader
+from common import ticks_ms, ticks_add, ticks_diff
+
+boot_at = ticks_ms()
 cpu_freq = 100000000
+profile = False # per-task step timing, rendered by the monitor task
+macros = () # macro files on flash, a key plays the n-th one with keymap action macro(n)
+config_path = "boards/pico70.json" # board profile, the same firmware runs every board
+dual_core = thread is not None # a second scheduler on core 1 where the port has threads, CircuitPython has none
+if hasattr(os, "getenv"):
+    config_path = os.getenv("KEYBOARD_CONFIG") or config_path # CircuitPython reads it from settings.toml
+    dual_core = dual_core and str(os.getenv("KEYBOARD_DUAL_CORE", 1)) != "0"
 if machine:
     machine.freq(cpu_freq)
     print("freq: %s mhz" % (machine.freq() / 1000000))
@@ -40,7 +50,7 @@ if microcontroller:
     print("freq: %s mhz" % (microcontroller.cpu.frequency / 1000000))
 
 
-FN = "FN"
+WHEEL_REPEAT_MS = 50 # wheel steps while a wheel key is held, the first one a period after the press
 
 
 def setup_pin(pin, direction, pull = None):
@@ -51,18 +61,6 @@ def setup_pin(pin, direction, pull = None):
     return io
 
 
-def get_level_value(pin, max_level = 4096, zero_zone = 200, negative = 1):
-    level_value = (pin.value * max_level) // 65536
-    middle_value = max_level // 2
-    value = middle_value - level_value
-    if abs(value) < zero_zone:
-        return 0
-    elif abs(value) < (middle_value - (2 * zero_zone)):
-        return value * negative
-    else:
-        return (value * middle_value * negative) // abs(value)
-
-
 class Button(object):
     def __init__(self, pin, direction, pull):
         self.io = digitalio.DigitalInOut(pin)
@@ -104,195 +102,314 @@ class Button(object):
 
 
 class CustomKeyBoard(object):
-    def __init__(self):
-        time.sleep(1)
-        self.keyboard = Keyboard(usb_hid.devices)
-        self.keyboard_layout = KeyboardLayoutUS(self.keyboard)
-        self.consumer_control = ConsumerControl(usb_hid.devices)
-        self.x_lines = [
-            setup_pin(board.GP4, digitalio.Direction.OUTPUT), # 0
-            setup_pin(board.GP5, digitalio.Direction.OUTPUT), # 1
-            setup_pin(board.GP6, digitalio.Direction.OUTPUT), # 2
-            setup_pin(board.GP7, digitalio.Direction.OUTPUT), # 3
-            setup_pin(board.GP8, digitalio.Direction.OUTPUT), # 4
-            setup_pin(board.GP9, digitalio.Direction.OUTPUT), # 5
-            setup_pin(board.GP10, digitalio.Direction.OUTPUT), # 6
-            setup_pin(board.GP11, digitalio.Direction.OUTPUT), # 7
-            setup_pin(board.GP12, digitalio.Direction.OUTPUT), # 8
-            setup_pin(board.GP13, digitalio.Direction.OUTPUT), # 9
-        ]
-        self.y_lines = [
-            setup_pin(board.GP14, digitalio.Direction.INPUT, digitalio.Pull.UP), # 0
-            setup_pin(board.GP15, digitalio.Direction.INPUT, digitalio.Pull.UP), # 1
-            setup_pin(board.GP16, digitalio.Direction.INPUT, digitalio.Pull.UP), # 2
-            setup_pin(board.GP17, digitalio.Direction.INPUT, digitalio.Pull.UP), # 3
-            setup_pin(board.GP18, digitalio.Direction.INPUT, digitalio.Pull.UP), # 4
-            setup_pin(board.GP19, digitalio.Direction.INPUT, digitalio.Pull.UP), # 5
-            setup_pin(board.GP20, digitalio.Direction.INPUT, digitalio.Pull.UP), # 6
-        ]
-        self.keys = [
-            [K.Q, K.W, K.E, K.R, K.T, K.Y, K.U, K.I, K.O, K.P],
-            [K.A, K.S, K.D, K.F, K.G, K.H, K.J, K.K, K.L, K.SEMICOLON],
-            [K.Z, K.X, K.C, K.V, K.B, K.N, K.M, K.COMMA, K.PERIOD, K.FORWARD_SLASH],
-            [K.ESCAPE, K.QUOTE, K.MINUS, K.EQUALS, K.SPACE, K.ENTER, K.LEFT_BRACKET, K.RIGHT_BRACKET, K.BACKSLASH, (K.BACKSPACE, K.PRINT_SCREEN)],
-            [K.ONE, K.TWO, K.THREE, K.FOUR, K.FIVE, K.SIX, K.SEVEN, K.EIGHT, (K.NINE, K.PAGE_UP), (K.ZERO, K.PAGE_DOWN)],
-            #[K.LEFT_SHIFT, (K.F1, K.F7), (K.F2, K.F8), (K.F3, K.F9), (K.F4, K.F10), (K.F5, K.F11), (K.F6, K.F12), (K.HOME, K.END), (K.CAPS_LOCK, K.DELETE), K.RIGHT_SHIFT],
-            #[FN, K.WINDOWS ,K.TAB, K.LEFT_CONTROL, K.ALT, K.GRAVE_ACCENT, K.UP_ARROW, K.DOWN_ARROW, K.LEFT_ARROW, K.RIGHT_ARROW],
-            [K.LEFT_SHIFT, K.TAB, K.LEFT_CONTROL, K.ALT, K.GRAVE_ACCENT, K.UP_ARROW, K.DOWN_ARROW, (K.LEFT_ARROW, K.PAGE_UP), (K.RIGHT_ARROW, K.PAGE_DOWN), K.RIGHT_SHIFT],
-            [FN, K.WINDOWS , (K.F1, K.F7), (K.F2, K.F8), (K.F3, K.F9), (K.F4, K.F10), (K.F5, K.F11), (K.F6, K.F12), (K.HOME, K.END), (K.DELETE, K.CAPS_LOCK)],
-        ]
-        self.press_buttons = [
-            [False, False, False, False, False, False, False, False, False, False],
-            [False, False, False, False, False, False, False, False, False, False],
-            [False, False, False, False, False, False, False, False, False, False],
-            [False, False, False, False, False, False, False, False, False, False],
-            [False, False, False, False, False, False, False, False, False, False],
-            [False, False, False, False, False, False, False, False, False, False],
-            [False, False, False, False, False, False, False, False, False, False],
-        ]
-        self.buttons = []
-        self.release = []
-
-    def press_keys(self, keys = []):
-        self.buttons = []
-        self.keyboard.press(*keys)
-        self.keyboard.release(*keys)
-        self.release.clear()
+    def __init__(self, config, events, debounce = EAGER, debounce_ms = 5, macro_id = None, unroll = False):
+        self.events = events
+        self.macro_id = macro_id
+        self.x_lines = [setup_pin(getattr(board, pin), digitalio.Direction.OUTPUT) for pin in config.columns]
+        self.y_lines = [setup_pin(getattr(board, pin), digitalio.Direction.INPUT, digitalio.Pull.UP) for pin in config.rows]
+        self.matrix = MatrixScanner(self.x_lines, self.y_lines, row_gpios = config.row_gpios)
+        if unroll and self.matrix.unroll(): # straight-line scan code generated for this board
+            print("unrolled scan: %s" % (self.matrix.emitter or "bytecode"))
+        self.keymap = config.keymap
+        self.engine = KeymapEngine(self.keymap, self)
+        self.state = bytearray(self.keymap.cols) # pressed rows bitmask per column
+        self.raw = bytearray(self.keymap.cols) # rows read this scan, before debouncing
+        self.debouncer = None
+        if debounce:
+            self.debouncer = Debouncer(self.keymap.rows, self.keymap.cols, debounce, debounce_ms)
+        self.scan_at = ticks_ms()
+        self.held = 0 # debounced keys down
+        self.mouse_keys = self.keymap.column_masks((MOUSE_LEFT, MOUSE_RIGHT, MOUSE_UP, MOUSE_DOWN, MOUSE_MIDDLE))
+        self.mouse_buttons = 0 # buttons held down through mouse keys
+        self.wheel_at = self.scan_at
+
+    def key_down(self, keycode):
+        if not MOUSE_LEFT <= keycode <= MOUSE_MIDDLE: # mouse keys act on release, or in mouse_hold()
+            self.events.post(KEY_DOWN, keycode)
+        elif keycode == MOUSE_UP or keycode == MOUSE_DOWN:
+            self.wheel_at = self.scan_at # repeats count from the press
+
+    def key_up(self, keycode):
+        if not MOUSE_LEFT <= keycode <= MOUSE_MIDDLE:
+            self.events.post(KEY_UP, keycode)
+        elif keycode == MOUSE_LEFT:
+            self.mouse_click(Mouse.LEFT_BUTTON)
+        elif keycode == MOUSE_RIGHT:
+            self.mouse_click(Mouse.RIGHT_BUTTON)
+        elif keycode == MOUSE_UP:
+            self.events.move(wheel = 3)
+        elif keycode == MOUSE_DOWN:
+            self.events.move(wheel = -3)
+        elif keycode == MOUSE_MIDDLE:
+            self.mouse_click(Mouse.MIDDLE_BUTTON)
+
+    def consumer(self, code):
+        self.events.post(CONSUMER, code)
+
+    def macro(self, n):
+        if self.macro_id:
+            self.events.post(MACRO, n, self.macro_id)
+
+    def mouse_click(self, button):
+        self.mouse_buttons &= ~button
+        self.events.post(CLICK, button)
+
+    def mouse_hold(self, i):
+        keycode = self.engine.active[i]
+        if keycode == MOUSE_LEFT:
+            self.mouse_press(Mouse.LEFT_BUTTON)
+        elif keycode == MOUSE_RIGHT:
+            self.mouse_press(Mouse.RIGHT_BUTTON)
+        elif keycode == MOUSE_MIDDLE:
+            self.mouse_press(Mouse.MIDDLE_BUTTON)
+        elif ticks_diff(self.scan_at, self.wheel_at) >= WHEEL_REPEAT_MS:
+            self.wheel_at = self.scan_at
+            if keycode == MOUSE_UP:
+                self.events.move(wheel = 3)
+            elif keycode == MOUSE_DOWN:
+                self.events.move(wheel = -3)
+
+    def mouse_press(self, button):
+        if not self.mouse_buttons & button: # once per hold, not every scan
+            self.mouse_buttons |= button
+            self.events.post(BUTTON_DOWN, button)
 
     def scan(self):
-        for x in range(10):
-            for i in range(10):
-                if i == x:
-                    self.x_lines[i].value = False # scan x line
-                else:
-                    self.x_lines[i].value = True # disable other lines
-            for y in range(6, -1, -1):
-                if self.y_lines[y].value == False: # pressd
-                    if self.press_buttons[y][x]: # y,x pressed, already pressed
-                        pass
-                    else: # y,x not pressed, first press
-                        if self.press_buttons[6][0]: # fn pressed
-                            if y == 6 and x == 0:
-                                pass
-                            else:
-                                if isinstance(self.keys[y][x], tuple):
-                                    self.buttons.append(self.keys[y][x][1])
-                                else:
-                                    self.buttons.append(self.keys[y][x])
-                        else:
-                            if y == 6 and x == 0:
-                                pass
-                            else:
-                                if isinstance(self.keys[y][x], tuple):
-                                    self.buttons.append(self.keys[y][x][0])
-                                else:
-                                    self.buttons.append(self.keys[y][x])
-                        self.press_buttons[y][x] = True
-                else: # not press
-                    if self.press_buttons[y][x]:
-                        self.press_buttons[y][x] = False
-                        if y == 6 and x == 0:
-                            pass
+        rows = self.keymap.rows
+        state = self.state
+        matrix = self.matrix
+        debouncer = self.debouncer
+        now = ticks_ms()
+        elapsed = ticks_diff(now, self.scan_at)
+        self.scan_at = now
+        self.engine.tick(now)
+        if self.held == 0 and not (debouncer and debouncer.pending) and not matrix.any_pressed():
+            return False # idle: all columns driven, one read and nothing pressed
+        raw = self.raw
+        matrix.scan(raw)
+        for x in range(self.keymap.cols):
+            bits = raw[x]
+            if debouncer:
+                bits = debouncer.filter(x, bits, elapsed)
+            changed = bits ^ state[x]
+            held = bits & state[x] & self.mouse_keys[x] # mouse keys already pressed at the last scan
+            if changed:
+                state[x] = bits
+                i = x * rows
+                while changed:
+                    if changed & 1:
+                        if bits & 1:
+                            self.held += 1
+                            self.engine.press(i, now)
                         else:
-                            if isinstance(self.keys[y][x], tuple):
-                                if self.keys[y][x][0] in self.buttons:
-                                    self.buttons.remove(self.keys[y][x][0])
-                                    self.release.append(self.keys[y][x][0])
-                                else:
-                                    self.buttons.remove(self.keys[y][x][1])
-                                    self.release.append(self.keys[y][x][1])
-                            else:
-                                if self.keys[y][x] in self.buttons:
-                                    self.buttons.remove(self.keys[y][x])
-                                self.release.append(self.keys[y][x])
-        if self.press_buttons[6][0]:
-            if K.UP_ARROW in self.buttons:
-                self.consumer_control.send(C.VOLUME_INCREMENT)
-                self.buttons.remove(K.UP_ARROW)
-            elif K.DOWN_ARROW in self.buttons:
-                self.consumer_control.send(C.VOLUME_DECREMENT)
-                self.buttons.remove(K.DOWN_ARROW)
-        try:
-            self.keyboard.press(*self.buttons)
-            self.keyboard.release(*self.release)
-            self.release.clear() # = []
-        except Exception as e:
-            self.release.clear()
-            try:
-                self.keyboard.release_all()
-            except Exception as e:
-                print("release_all keys error: ", e)
-            try:
-                time.sleep(1)
-                self.keyboard = Keyboard(usb_hid.devices)
-            except Exception as e:
-                print("reinit keyboard error: ", e)
-            print(e)
+                            self.held -= 1
+                            self.engine.release(i, now)
+                    changed >>= 1
+                    bits >>= 1
+                    i += 1
+            if held:
+                i = x * rows
+                while held:
+                    if held & 1:
+                        self.mouse_hold(i)
+                    held >>= 1
+                    i += 1
+        return True
+
+
+def core_stats(scheduler, writer = None):
+    # this core's load, task rates, gc and, when profiling, task and hid stats, which are reset for the next round;
+    # only ever called on the scheduler's own core, the other core gets a copy through the channel
+    hid = None
+    tasks = ()
+    if scheduler.profile:
+        tasks = scheduler.task_stats()
+        scheduler.reset_stats()
+        if writer:
+            hid = writer.stats() + (writer.errors,)
+            writer.reset_stats()
+    return scheduler.cpu, scheduler.idle, scheduler.task_rates(), scheduler.gc_stats(), tasks, hid
+
+
+def stats_reporter(task, name, scheduler = None, monitor_id = None, writer = None, interval = 2000):
+    # sends the monitor on the other core this core's stats
+    msgs = [None]
+    while True:
+        msgs[0] = scheduler.message(core_stats(scheduler, writer), monitor_id)
+        yield task.sleep(interval, msgs)
 
 
-def monitor(task, name, scheduler = None, display_id = None):
+def monitor(task, name, scheduler = None, display_id = None, writer = None):
+    content = {"msg": ""}
+    msgs = [None]
+    peers = {} # cpu -> latest stats sent by stats_reporter
     while True:
-        gc.collect()
-        monitor_msg = "CPU%s:%3d%%  RAM:%3d%%" % (scheduler.cpu, int(100 - scheduler.idle), int(100 - (scheduler.mem_free() * 100 / (264 * 1024))))
-        yield Condition(sleep = 2000, send_msgs = [Message({"msg": monitor_msg}, receiver = display_id)])
+        while task.has_message():
+            msg = task.get_message()
+            peers[msg.content[0]] = msg.content
+            msg.release()
+        cores = [core_stats(scheduler, writer)] + [peers[cpu] for cpu in sorted(peers)]
+        cpus = ""
+        rates = ""
+        for cpu, idle, task_rates, gc_stats, tasks, hid in cores:
+            cpus += "CPU%s:%3d%%  " % (cpu, int(100 - idle))
+            for task_id, task_name, interval in task_rates:
+                rates += "  %s:%dms" % (task_name, interval)
+        content["msg"] = "%sRAM:%3d%%%s" % (cpus, int(100 - (scheduler.mem_free() * 100 / (264 * 1024))), rates)
+        for core in cores:
+            if core[3]:
+                content["msg"] += "  GC:%d avg %dus max %dus" % core[3][:3]
+        if scheduler.profile:
+            lines = [content["msg"], "%-10s %5s %6s %6s %5s %5s %4s %4s" % ("task", "steps", "avg_us", "max_us", "late", "max_l", "sent", "recv")]
+            for core in cores:
+                for task_id, task_name, steps, avg_us, max_us, late, max_late, sent, recv in core[4]:
+                    lines.append("%-10s %5d %6d %6d %5d %5d %4d %4d" % (task_name, steps, avg_us, max_us, late, max_late, sent, recv))
+            for core in cores:
+                if core[5]:
+                    lines.append("hid: %d events, latency avg %d us max %d us, %d errors" % core[5])
+            for core in cores:
+                if core[3]:
+                    lines.append("gc on cpu%d: %d runs, pause avg %d us max %d us, %d gaps deferred, %d by the runtime" % ((core[0],) + core[3]))
+            content["msg"] = "\n".join(lines)
+        msgs[0] = scheduler.message(content, display_id)
+        yield task.sleep(2000, msgs)
 
 
 def display(task, name):
     while True:
-        yield Condition(sleep = 0, wait_msg = True)
+        yield task.wait()
         msg = task.get_message()
         print(msg.content["msg"])
-
-
-def keyboard_scan(task, name, interval = 50, display_id = None):
-    k = CustomKeyBoard()
+        msg.release()
+
+
+def hid_writer(task, name, writer = None, retry_ms = 5, max_retry_ms = 500, usb_poll_ms = 20):
+    # the only task that writes USB HID: applies the events of every scanner, then sends the changed reports once,
+    # until the host has configured the device the events wait in the mailbox, the scanners run meanwhile
+    backoff = Cadence(retry_ms, max_retry_ms, 0) # doubles per failed flush, back to retry_ms after a good one
+    backoff.update(True)
+    retry_at = None # next flush while sends fail
+    first = True
+    while not usb_ready():
+        yield task.sleep(usb_poll_ms)
+    while True:
+        writer.begin()
+        while task.has_message(): # drained during a backoff too, so a full mailbox never drops a key release
+            msg = task.get_message()
+            writer.apply(msg.content, msg.stamp) # held in order behind a report that failed
+            msg.release()
+        now = ticks_ms()
+        if writer.blocked and retry_at is None:
+            retry_at = ticks_add(now, backoff.update(False))
+        if retry_at is None or ticks_diff(now, retry_at) >= 0:
+            if writer.retry() and writer.flush():
+                retry_at = None
+                if backoff.interval != retry_ms:
+                    backoff.update(True)
+                if first and writer.first_report_at is not None:
+                    first = False
+                    print("first hid report %d ms after boot" % ticks_diff(writer.first_report_at, boot_at))
+                yield task.wait()
+                continue
+            retry_at = ticks_add(now, backoff.update(False)) # reports stay dirty, tried again even if no new event comes
+        yield task.sleep(retry_ms)
+
+
+def macro_player(task, name, writer_id = None, macros = (), delay_ms = 10):
+    # types macro files a character per step with delay_ms between them, the scanners keep running in between
+    events = EventQueue(task, writer_id)
+    reader = MacroReader(KeyboardLayoutUS(None))
+    while True:
+        yield task.wait()
+        msg = task.get_message()
+        n = msg.content & 0xFFFFFF
+        msg.release()
+        if n >= len(macros):
+            continue
+        try:
+            reader.open(macros[n])
+        except OSError as e:
+            print("macro %s: %s" % (macros[n], e))
+            continue
+        while True:
+            try:
+                pause = reader.step(events)
+            except Exception as e:
+                print("macro %s: %s" % (macros[n], e))
+                pause = -1
+            if pause < 0:
+                break
+            yield events.sleep(delay_ms + pause)
+            events.sent()
+        reader.close()
+
+
+def keyboard_scan(task, name, config = None, writer_id = None, macro_id = None, interval = 1, idle_interval = 10, quiet_ms = 2000, display_id = None, debounce = EAGER, debounce_ms = 5, unroll = True):
+    # scans every interval ms while keys are down, slows to idle_interval after quiet_ms untouched
+    events = EventQueue(task, writer_id)
+    k = CustomKeyBoard(config, events, debounce, debounce_ms, macro_id, unroll)
+    cadence = Cadence(interval, idle_interval, quiet_ms)
+    task.set_cadence(cadence)
     while True:
         t = ticks_ms()
         try:
-            k.scan()
+            active = k.scan()
         except Exception as e:
+            active = True
             print(e)
         tt = ticks_ms()
-        sleep_time = interval - ticks_diff(tt, t)
-        if sleep_time > 0:
-            yield Condition(sleep = sleep_time)
-        else:
-            yield Condition(sleep = 0)
-
-
-def mouse_scan(task, name, interval = 50, display_id = None):
-    time.sleep(1)
-    mouse = Mouse(usb_hid.devices)
-    x_axis = analogio.AnalogIn(board.A1)
-    y_axis = analogio.AnalogIn(board.A0)
-    mouse_left_button = Button(board.GP0, digitalio.Direction.INPUT, digitalio.Pull.UP)
-    mouse_right_button = Button(board.GP1, digitalio.Direction.INPUT, digitalio.Pull.UP)
-    mouse_wheel_up_button = Button(board.GP2, digitalio.Direction.INPUT, digitalio.Pull.UP)
-    mouse_wheel_down_button = Button(board.GP3, digitalio.Direction.INPUT, digitalio.Pull.UP)
+        sleep_time = cadence.update(active, tt) - ticks_diff(tt, t)
+        yield events.sleep(sleep_time if sleep_time > 0 else 0)
+        events.sent()
+
+
+def mouse_scan(task, name, config = None, writer_id = None, interval = 5, idle_interval = 50, quiet_ms = 1000, step_ms = 25, display_id = None):
+    # polls every interval ms while the stick is off-centre or a button is down, idle_interval otherwise,
+    # the wheel buttons, on boards that have them, repeat every step_ms while held whatever the poll rate
+    cadence = Cadence(interval, idle_interval, quiet_ms)
+    task.set_cadence(cadence)
+    events = EventQueue(task, writer_id)
+    buttons = 0 # reported down
+    joystick = Joystick(analogio.AnalogIn(getattr(board, config.joystick[0])), analogio.AnalogIn(getattr(board, config.joystick[1])))
+    mouse_left_button = None
+    if config.mouse_buttons: # left, right, wheel up and wheel down
+        mouse_left_button, mouse_right_button, mouse_wheel_up_button, mouse_wheel_down_button = [
+            Button(getattr(board, pin), digitalio.Direction.INPUT, digitalio.Pull.UP) for pin in config.mouse_buttons]
+    last = ticks_ms()
+    wheel_at = ticks_add(last, -step_ms)
     while True:
         t = ticks_ms()
-        x = get_level_value(y_axis, negative = -1)
-        y = get_level_value(x_axis, negative = -1)
-
-        if mouse_left_button.click():
-            mouse.click(Mouse.LEFT_BUTTON)
-        if mouse_left_button.press():
-            mouse.press(Mouse.LEFT_BUTTON)
-        if mouse_right_button.click():
-            mouse.click(Mouse.RIGHT_BUTTON)
-        if mouse_right_button.press():
-            mouse.press(Mouse.RIGHT_BUTTON)
-        if mouse_wheel_up_button.continue_click(): # or mouse_wheel_up_button.press():
-            mouse.move(wheel = 1)
-        elif mouse_wheel_down_button.continue_click(): # or mouse_wheel_down_button.press():
-            mouse.move(wheel = -1)
-        mouse.move(x = x // 120, y = y // 120)
+        elapsed = ticks_diff(t, last)
+        last = t
+        active = joystick.update(elapsed)
+        wheel = 0
+        if mouse_left_button:
+            if mouse_left_button.click():
+                buttons &= ~Mouse.LEFT_BUTTON
+                events.post(CLICK, Mouse.LEFT_BUTTON)
+            if mouse_left_button.press() and not buttons & Mouse.LEFT_BUTTON:
+                buttons |= Mouse.LEFT_BUTTON
+                events.post(BUTTON_DOWN, Mouse.LEFT_BUTTON)
+            if mouse_right_button.click():
+                buttons &= ~Mouse.RIGHT_BUTTON
+                events.post(CLICK, Mouse.RIGHT_BUTTON)
+            if mouse_right_button.press() and not buttons & Mouse.RIGHT_BUTTON:
+                buttons |= Mouse.RIGHT_BUTTON
+                events.post(BUTTON_DOWN, Mouse.RIGHT_BUTTON)
+            if mouse_wheel_up_button.continue_click(): # or mouse_wheel_up_button.press():
+                wheel = 1
+            elif mouse_wheel_down_button.continue_click(): # or mouse_wheel_down_button.press():
+                wheel = -1
+            active = active or wheel or mouse_left_button.status != "up" or mouse_right_button.status != "up"
+            if wheel and ticks_diff(t, wheel_at) >= step_ms:
+                wheel_at = t
+            else:
+                wheel = 0
+        events.move(joystick.dx, joystick.dy, wheel)
         tt = ticks_ms()
-        sleep_time = interval - ticks_diff(tt, t)
-        if sleep_time > 0:
-            yield Condition(sleep = sleep_time)
-        else:
-            yield Condition(sleep = 0)
+        sleep_time = cadence.update(active, tt) - ticks_diff(tt, t)
+        yield events.sleep(sleep_time if sleep_time > 0 else 0)
+        events.sent()
 
 
 def brightness_control(task, name, interval = 50, display_id = None):
@@ -324,29 +441,43 @@ def brightness_control(task, name, interval = 50, display_id = None):
         tt = ticks_ms()
         sleep_time = interval - ticks_diff(tt, t)
         if sleep_time > 0:
-            yield Condition(sleep = sleep_time)
+            yield task.sleep(sleep_time)
         else:
-            yield Condition(sleep = 0)
+            yield task.sleep(0)
 
 
 def led_breath(task, name, interval = 500, display_id = None):
     led = setup_pin(board.GP25, digitalio.Direction.OUTPUT) # breathing light for status checking
     led.value = True
-    yield Condition(sleep = interval)
+    yield task.sleep(interval)
     while True:
         led.value = not led.value
-        yield Condition(sleep = interval)
+        yield task.sleep(interval)
 
 
 if __name__ == "__main__":
     try:
-        s = Scheluder(cpu = 0)
-        display_id = s.add_task(Task(display, "display"))
-        monitor_id = s.add_task(Task(monitor, "monitor", kwargs = {"scheduler": s, "display_id": display_id}))
-        keyboard_id = s.add_task(Task(keyboard_scan, "keyboard", kwargs = {"interval": 50, "display_id": display_id}))
-        mouse_id = s.add_task(Task(mouse_scan, "mouse", kwargs = {"interval": 25, "display_id": display_id}))
-        brightness_id = s.add_task(Task(brightness_control, "brightness", kwargs = {"interval": 50, "display_id": display_id}))
-        led_id = s.add_task(Task(led_breath, "led", kwargs = {"interval": 500, "display_id": display_id}))
+        writer = HidWriter(HidOutput(usb_hid.devices), profile)
+        s = Scheluder(cpu = 0, profile = profile, pool_size = 32)
+        s1 = s
+        if dual_core: # matrix scan and the HID writer on core 0, everything else on core 1
+            s1 = Scheluder(cpu = 1, name = "scheduler1", profile = profile, pool_size = 32)
+            s.connect(s1)
+        s.manage_gc() # collections in the keyboard core's idle gaps, never while keys are active
+        config = load_board(config_path)
+        display_id = s1.add_task(Task(display, "display"))
+        monitor_id = s1.add_task(Task(monitor, "monitor", kwargs = {"scheduler": s1, "display_id": display_id, "writer": writer if s1 is s else None}))
+        if s1 is not s: # the writer's and core 0's stats are taken on core 0 and sent over
+            s.add_task(Task(stats_reporter, "stats", kwargs = {"scheduler": s, "monitor_id": monitor_id, "writer": writer}))
+        writer_id = s.add_task(Task(hid_writer, "hid", kwargs = {"writer": writer}, mailbox_size = 64))
+        macro_id = s1.add_task(Task(macro_player, "macro", kwargs = {"writer_id": writer_id, "macros": macros}))
+        keyboard_id = s.add_task(Task(keyboard_scan, "keyboard", kwargs = {"config": config, "writer_id": writer_id, "macro_id": macro_id, "interval": 1, "idle_interval": 10, "quiet_ms": 2000, "debounce": EAGER, "debounce_ms": 5, "unroll": True, "display_id": display_id}))
+        mouse_id = s1.add_task(Task(mouse_scan, "mouse", kwargs = {"config": config, "writer_id": writer_id, "interval": 5, "idle_interval": 50, "quiet_ms": 1000, "display_id": display_id}))
+        if config.brightness: # backlight fitted, on the pi5 board its pins are matrix columns
+            brightness_id = s1.add_task(Task(brightness_control, "brightness", kwargs = {"interval": 50, "display_id": display_id}))
+        led_id = s1.add_task(Task(led_breath, "led", kwargs = {"interval": 500, "display_id": display_id}))
+        if s1 is not s:
+            s1.start_thread()
         s.run()
     except Exception as e:
         print("main: %s" % str(e))
@@ -1,27 +1,89 @@
-import os
 import time
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
 platform = "circuitpython"
 supervisor = None
 try:
     import supervisor
 except:
     platform = "micropython"
-    print("micropython, no supervisor module exists, use time.ticks_ms instead")
+    if hasattr(time, "ticks_ms"):
+        print("micropython, no supervisor module exists, use time.ticks_ms instead")
+    else:
+        platform = "cpython"
+        print("cpython, no supervisor module exists, use time.monotonic instead")
 
 _TICKS_PERIOD = const(1<<29)
 _TICKS_MAX = const(_TICKS_PERIOD-1)
 _TICKS_HALFPERIOD = const(_TICKS_PERIOD//2)
 
+_clock = None # pluggable time source, see set_clock()
+
+
+class VirtualClock(object):
+    # deterministic time that only moves when somebody sleeps or calls advance()
+    def __init__(self, start_ms = 0):
+        self.us = start_ms * 1000
+        self.sleeps = 0
+        self.slept_us = 0
+
+    def now_ms(self):
+        return self.us // 1000
+
+    def ticks_ms(self):
+        return (self.us // 1000) & _TICKS_MAX
+
+    def ticks_us(self):
+        return self.us & _TICKS_MAX
+
+    def sleep_ms(self, t):
+        us = int(t * 1000)
+        self.us += us
+        self.sleeps += 1
+        self.slept_us += us
+
+    def advance(self, ms):
+        self.us += int(ms * 1000)
+
+
+def set_clock(clock):
+    # clock needs ticks_ms(), ticks_us() and sleep_ms(t), None restores the hardware clock
+    global _clock
+    _clock = clock
+
+
+def get_clock():
+    return _clock
+
 
 def ticks_ms():
-    if supervisor:
+    if _clock:
+        return _clock.ticks_ms()
+    elif supervisor:
         return supervisor.ticks_ms()
+    elif platform == "cpython":
+        return int(time.monotonic() * 1000) & _TICKS_MAX
     else:
         return time.ticks_ms()
 
 
+def ticks_us():
+    if _clock:
+        return _clock.ticks_us()
+    elif platform == "micropython":
+        return time.ticks_us()
+    else:
+        return (time.monotonic_ns() // 1000) & _TICKS_MAX
+
+
 def sleep_ms(t):
-    time.sleep(t / 1000.0)
+    if _clock:
+        _clock.sleep_ms(t)
+    else:
+        time.sleep(t / 1000.0)
 
 
 def ticks_add(ticks, delta):
@@ -0,0 +1,107 @@
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+EAGER = "eager" # report a change at once, then ignore the key for the window
+DEFER = "defer" # report a change once the key has been stable for the window
+INTEGRATOR = "integrator" # count up while pressed and down while released, flip at the rails
+
+_STATE = const(0x80)
+_TIMER = const(0x7f)
+
+
+class Debouncer(object):
+    # one byte per key: bit 7 debounced state, bits 0-6 ms timer or integrator count
+    def __init__(self, rows, cols, algorithm = EAGER, window_ms = 5):
+        self.rows = rows
+        self.cols = cols
+        self.window = window_ms if window_ms < _TIMER else _TIMER
+        self.keys = bytearray(rows * cols)
+        self.stable = bytearray(cols) # debounced rows bitmask per column
+        self.busy = bytearray(cols) # keys with a running timer per column
+        self.pending = 0 # columns with a running timer
+        if algorithm == EAGER:
+            self.update = self.eager
+        elif algorithm == DEFER:
+            self.update = self.defer
+        elif algorithm == INTEGRATOR:
+            self.update = self.integrator
+        else:
+            raise ValueError("unknown debounce algorithm: %s" % algorithm)
+
+    def filter(self, x, raw, elapsed):
+        # raw rows bitmask of column x in, debounced bitmask out
+        stable = self.stable[x]
+        if raw == stable and not self.busy[x]:
+            return stable
+        pending = (raw ^ stable) | self.busy[x]
+        busy = 0
+        bit = 1
+        i = x * self.rows
+        while pending:
+            if pending & 1:
+                if self.update(i, _STATE if raw & bit else 0, elapsed):
+                    busy |= bit
+                if self.keys[i] & _STATE:
+                    stable |= bit
+                else:
+                    stable &= ~bit
+            pending >>= 1
+            bit <<= 1
+            i += 1
+        self.stable[x] = stable
+        if busy and not self.busy[x]:
+            self.pending += 1
+        elif self.busy[x] and not busy:
+            self.pending -= 1
+        self.busy[x] = busy
+        return stable
+
+    def eager(self, i, pressed, elapsed):
+        key = self.keys[i]
+        state = key & _STATE
+        timer = key & _TIMER
+        if timer:
+            timer = timer - elapsed if timer > elapsed else 0
+        if timer == 0 and pressed != state:
+            state = pressed
+            timer = self.window
+        self.keys[i] = state | timer
+        return timer
+
+    def defer(self, i, pressed, elapsed):
+        key = self.keys[i]
+        state = key & _STATE
+        timer = key & _TIMER
+        if pressed == state:
+            timer = 0
+        elif timer == 0:
+            timer = 1 # first sample of the new level, the window starts here
+        else:
+            timer += elapsed
+            if timer > self.window:
+                state = pressed
+                timer = 0
+        self.keys[i] = state | timer
+        return timer
+
+    def integrator(self, i, pressed, elapsed):
+        key = self.keys[i]
+        state = key & _STATE
+        count = key & _TIMER
+        half = (self.window + 1) // 2 # rounded up, so two samples flip an odd window too
+        step = elapsed if elapsed < half else half # at least two samples to flip
+        if step < 1:
+            step = 1
+        if pressed:
+            count = count + step if count + step < self.window else self.window
+        else:
+            count = count - step if count > step else 0
+        if count == self.window:
+            state = _STATE
+        elif count == 0:
+            state = 0
+        self.keys[i] = state | count
+        return count != (self.window if state else 0)
@@ -0,0 +1,43 @@
+# input events are small ints, kind in the top byte and the payload below, so they fit a pooled message as is
+KEY_DOWN = 1 # keycode
+KEY_UP = 2 # keycode
+CONSUMER = 3 # consumer control code
+BUTTON_DOWN = 4 # mouse buttons mask
+BUTTON_UP = 5
+CLICK = 6
+MOVE = 7 # x, y and wheel as signed bytes
+MACRO = 8 # macro number, for the macro player
+
+
+def move(x = 0, y = 0, wheel = 0):
+    x = -127 if x < -127 else (127 if x > 127 else x)
+    y = -127 if y < -127 else (127 if y > 127 else y)
+    wheel = -127 if wheel < -127 else (127 if wheel > 127 else wheel)
+    return MOVE << 24 | (x & 0xFF) << 16 | (y & 0xFF) << 8 | (wheel & 0xFF)
+
+
+def signed_byte(v):
+    return v - 256 if v > 127 else v
+
+
+class EventQueue(object):
+    # events of one scanner task, handed to the scheduler as the send_msgs of its next yield
+    def __init__(self, task, receiver):
+        self.task = task
+        self.receiver = receiver
+        self.msgs = []
+
+    def post(self, kind, value = 0, receiver = None):
+        self.msgs.append(self.task.scheduler.message(kind << 24 | value, receiver if receiver else self.receiver))
+
+    def move(self, x = 0, y = 0, wheel = 0):
+        if x or y or wheel:
+            self.msgs.append(self.task.scheduler.message(move(x, y, wheel), self.receiver))
+
+    def sleep(self, ms = 0):
+        return self.task.sleep(ms, self.msgs)
+
+    def sent(self):
+        # call after the yield returns, the scheduler has delivered everything by then
+        if self.msgs:
+            self.msgs.clear()
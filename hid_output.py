@@ -0,0 +1,389 @@
+from array import array
+supervisor = None
+try:
+    import supervisor
+except:
+    pass
+
+from adafruit_hid import find_device
+
+from common import ticks_ms, ticks_us, ticks_diff
+from events import KEY_DOWN, KEY_UP, CONSUMER, BUTTON_DOWN, BUTTON_UP, CLICK, MOVE, signed_byte
+
+_MAX_KEYS = 6
+_MAX_OVERFLOW = 16
+_MAX_HELD = 32 # events queued behind a report that could not be sent
+
+
+def usb_ready():
+    # the host has configured the device, reports sent before that fail or are lost
+    if supervisor and hasattr(supervisor, "runtime"):
+        return supervisor.runtime.usb_connected
+    return True
+
+
+class KeyboardReport(object):
+    # boot keyboard report: modifier bits, reserved byte, up to six keycodes
+    def __init__(self, device):
+        self.device = device
+        self.report = bytearray(8)
+        self.sent = bytearray(8) # last report the host got
+        self.dirty = True # send the empty report once so the host starts from a known state
+        self.overflow = bytearray(_MAX_OVERFLOW) # keys held while all six slots were taken, oldest first
+        self.overflowed = 0
+
+    def press(self, keycode):
+        if 0xE0 <= keycode <= 0xE7: # modifiers
+            bit = 1 << (keycode - 0xE0)
+            if not self.report[0] & bit:
+                self.report[0] |= bit
+                self.dirty = True
+            return
+        free = 0
+        for i in range(2, 2 + _MAX_KEYS):
+            if self.report[i] == keycode:
+                return
+            if free == 0 and self.report[i] == 0:
+                free = i
+        if free:
+            self.report[free] = keycode
+            self.dirty = True
+            return
+        for i in range(self.overflowed):
+            if self.overflow[i] == keycode:
+                return
+        if self.overflowed < _MAX_OVERFLOW: # reported once a slot frees up while it is still held
+            self.overflow[self.overflowed] = keycode
+            self.overflowed += 1
+
+    def release(self, keycode):
+        if 0xE0 <= keycode <= 0xE7:
+            bit = 1 << (keycode - 0xE0)
+            if self.report[0] & bit:
+                self.report[0] &= ~bit
+                self.dirty = True
+            return
+        for i in range(2, 2 + _MAX_KEYS):
+            if self.report[i] == keycode:
+                self.report[i] = 0
+                self.dirty = True
+                if self.overflowed: # the oldest key still waiting takes the slot
+                    self.report[i] = self.overflow[0]
+                    self.unqueue(0)
+                return
+        for i in range(self.overflowed):
+            if self.overflow[i] == keycode:
+                self.unqueue(i)
+                return
+
+    def unqueue(self, i):
+        overflow = self.overflow
+        self.overflowed -= 1
+        while i < self.overflowed:
+            overflow[i] = overflow[i + 1]
+            i += 1
+        overflow[i] = 0
+
+    def release_all(self):
+        for i in range(8):
+            if self.report[i]:
+                self.report[i] = 0
+                self.dirty = True
+        self.overflowed = 0
+
+    def unsent(self, keycode):
+        # pressed since the last report, releasing it now would swallow the key press
+        if 0xE0 <= keycode <= 0xE7:
+            bit = 1 << (keycode - 0xE0)
+            return self.report[0] & bit and not self.sent[0] & bit
+        pressed = False
+        for i in range(2, 2 + _MAX_KEYS):
+            if self.sent[i] == keycode:
+                return False
+            if self.report[i] == keycode:
+                pressed = True
+        return pressed
+
+    def flush(self):
+        if self.dirty:
+            self.device.send_report(self.report)
+            for i in range(8):
+                self.sent[i] = self.report[i]
+            self.dirty = False
+            return 1
+        return 0
+
+
+class MouseReport(object):
+    # buttons, x, y, wheel; motion and button changes of one cycle go out together
+    def __init__(self, device):
+        self.device = device
+        self.report = bytearray(4)
+        self.buttons = 0
+        self.sent_buttons = 0
+        self.clicks = 0
+        self.x = 0
+        self.y = 0
+        self.wheel = 0
+        self.dirty = True
+
+    def press(self, buttons):
+        if self.buttons | buttons != self.buttons:
+            self.buttons |= buttons
+            self.dirty = True
+
+    def release(self, buttons):
+        if self.buttons & buttons:
+            self.buttons &= ~buttons
+            self.dirty = True
+
+    def release_all(self):
+        self.release(self.buttons)
+
+    def unsent(self, buttons):
+        return self.buttons & buttons & ~self.sent_buttons
+
+    def click(self, buttons):
+        # down in the next report and up in the one after it, buttons already held only go up
+        held = buttons & self.buttons
+        if held:
+            self.release(held)
+        if buttons & ~held:
+            self.clicks |= buttons & ~held
+            self.dirty = True
+
+    def move(self, x = 0, y = 0, wheel = 0):
+        if x or y or wheel:
+            self.x += x
+            self.y += y
+            self.wheel += wheel
+            self.dirty = True
+
+    def flush(self):
+        if not self.dirty:
+            return 0
+        sent = 0
+        report = self.report
+        while True:
+            x = self.x if -127 <= self.x <= 127 else (127 if self.x > 0 else -127)
+            y = self.y if -127 <= self.y <= 127 else (127 if self.y > 0 else -127)
+            wheel = self.wheel if -127 <= self.wheel <= 127 else (127 if self.wheel > 0 else -127)
+            report[0] = self.buttons | self.clicks
+            self.sent_buttons = report[0]
+            report[1] = x & 0xFF
+            report[2] = y & 0xFF
+            report[3] = wheel & 0xFF
+            self.device.send_report(report)
+            sent += 1
+            self.x -= x
+            self.y -= y
+            self.wheel -= wheel
+            if self.clicks:
+                self.buttons &= ~self.clicks # click is press then release
+                self.clicks = 0
+            elif self.x == 0 and self.y == 0 and self.wheel == 0:
+                break
+        self.dirty = False
+        return sent
+
+
+class ConsumerReport(object):
+    def __init__(self, device):
+        self.device = device
+        self.report = bytearray(2)
+        self.code = 0
+
+    def send(self, code):
+        self.code = code
+
+    def flush(self):
+        if not self.code:
+            return 0
+        self.report[0] = self.code & 0xFF
+        self.report[1] = self.code >> 8
+        self.device.send_report(self.report)
+        self.report[0] = 0
+        self.report[1] = 0
+        self.device.send_report(self.report)
+        self.code = 0
+        return 2
+
+
+class HidOutput(object):
+    # keeps the last report of each device and only sends the ones that changed
+    def __init__(self, devices):
+        self.keyboard = KeyboardReport(find_device(devices, usage_page = 0x01, usage = 0x06))
+        self.mouse = MouseReport(find_device(devices, usage_page = 0x01, usage = 0x02))
+        self.consumer = ConsumerReport(find_device(devices, usage_page = 0x0C, usage = 0x01))
+        self.reports = 0
+
+    def flush(self):
+        self.reports += self.keyboard.flush() + self.consumer.flush() + self.mouse.flush()
+
+
+class HidWriter(object):
+    # applies the input events of every scanner, then sends the changed reports once per batch,
+    # and when profiling measures how long events waited from the scanner to the end of their report
+    def __init__(self, hid, profile = False):
+        self.hid = hid
+        self.profile = profile # the events' stamps are only set while the scheduler profiles
+        self.batch_at = 0
+        self.batch_age = 0
+        self.batch_events = 0
+        self.batch_max = 0
+        self.events = 0
+        self.latency_us = 0
+        self.max_latency_us = 0
+        self.errors = 0
+        self.first_report_at = None # ticks_ms of the first report the host took
+        self.blocked = False # the last flush failed, events that need one wait in held until retry()
+        self.held = array("L", [0] * _MAX_HELD) # events in arrival order, consecutive moves merged
+        self.held_stamps = array("L", [0] * _MAX_HELD)
+        self.held_count = 0
+        self.dropped = 0 # moves lost with held full
+        self.collapsed = 0 # held events applied without their flushes, see collapse()
+
+    def begin(self):
+        if self.profile and self.batch_events == 0: # a batch whose flush failed keeps its start
+            self.batch_at = ticks_us()
+
+    def needs_flush(self, event):
+        # a press and its release in one batch would cancel out, the press has to be sent first
+        kind = event >> 24
+        value = event & 0xFFFFFF
+        if kind == KEY_UP:
+            return self.hid.keyboard.unsent(value)
+        elif kind == BUTTON_UP:
+            return self.hid.mouse.unsent(value)
+        elif kind == CONSUMER:
+            return self.hid.consumer.code
+        return False
+
+    def apply(self, event, stamp):
+        # False when the event is held: it needs a flush while flushes fail, or older events are held already,
+        # the mailbox keeps draining meanwhile and retry() applies the held events in order
+        if self.held_count or (self.needs_flush(event) and (self.blocked or not self.flush())):
+            self.hold(event, stamp)
+            return False
+        self.update(event, stamp)
+        return True
+
+    def hold(self, event, stamp):
+        held = self.held
+        n = self.held_count
+        if event >> 24 == MOVE and n and held[n - 1] >> 24 == MOVE: # motion adds up, one move for the lot
+            last = held[n - 1]
+            x = signed_byte((last >> 16) & 0xFF) + signed_byte((event >> 16) & 0xFF)
+            y = signed_byte((last >> 8) & 0xFF) + signed_byte((event >> 8) & 0xFF)
+            wheel = signed_byte(last & 0xFF) + signed_byte(event & 0xFF)
+            if -127 <= x <= 127 and -127 <= y <= 127 and -127 <= wheel <= 127:
+                held[n - 1] = MOVE << 24 | (x & 0xFF) << 16 | (y & 0xFF) << 8 | (wheel & 0xFF)
+                return
+        if n == _MAX_HELD: # full, motion is lost before any key or button change
+            if event >> 24 == MOVE:
+                self.dropped += 1
+                return
+            i = 0
+            while i < n and held[i] >> 24 != MOVE:
+                i += 1
+            if i < n:
+                self.dropped += 1
+                n -= 1
+                while i < n:
+                    held[i] = held[i + 1]
+                    self.held_stamps[i] = self.held_stamps[i + 1]
+                    i += 1
+            else:
+                n = self.collapse()
+        held[n] = event
+        self.held_stamps[n] = stamp
+        self.held_count = n + 1
+
+    def collapse(self):
+        # the held events go into the reports without the flushes between them: taps among them cancel out,
+        # but every release is applied so the reports end up matching the keys and buttons really down
+        for i in range(self.held_count):
+            self.update(self.held[i], self.held_stamps[i])
+        self.collapsed += self.held_count
+        self.held_count = 0
+        return 0
+
+    def update(self, event, stamp):
+        kind = event >> 24
+        value = event & 0xFFFFFF
+        if kind == KEY_DOWN:
+            self.hid.keyboard.press(value)
+        elif kind == KEY_UP:
+            self.hid.keyboard.release(value)
+        elif kind == MOVE:
+            self.hid.mouse.move(signed_byte(value >> 16), signed_byte((value >> 8) & 0xFF), signed_byte(value & 0xFF))
+        elif kind == CONSUMER:
+            self.hid.consumer.send(value)
+        elif kind == BUTTON_DOWN:
+            self.hid.mouse.press(value)
+        elif kind == BUTTON_UP:
+            self.hid.mouse.release(value)
+        elif kind == CLICK:
+            self.hid.mouse.click(value)
+        if not self.profile:
+            return True
+        age = ticks_diff(self.batch_at, stamp)
+        if age < 0:
+            age = 0
+        self.batch_age += age
+        self.batch_events += 1
+        if age > self.batch_max:
+            self.batch_max = age
+        return True
+
+    def retry(self):
+        # applies the held events in order, False while a report ahead of one still fails
+        held = self.held
+        count = self.held_count
+        i = 0
+        while i < count:
+            if self.needs_flush(held[i]) and not self.flush():
+                break
+            self.update(held[i], self.held_stamps[i])
+            i += 1
+        n = 0
+        while i < count:
+            held[n] = held[i]
+            self.held_stamps[n] = self.held_stamps[i]
+            n += 1
+            i += 1
+        self.held_count = n
+        return n == 0
+
+    def flush(self):
+        # False when a report failed, it stays dirty and goes out with the next flush
+        try:
+            self.hid.flush()
+        except Exception as e:
+            self.errors += 1
+            self.blocked = True
+            print("hid report error: ", e)
+            return False
+        self.blocked = False
+        if self.first_report_at is None and self.hid.reports:
+            self.first_report_at = ticks_ms()
+        if self.batch_events:
+            spent = ticks_diff(ticks_us(), self.batch_at)
+            self.events += self.batch_events
+            self.latency_us += self.batch_age + spent * self.batch_events
+            if self.batch_max + spent > self.max_latency_us:
+                self.max_latency_us = self.batch_max + spent
+            self.batch_age = 0
+            self.batch_events = 0
+            self.batch_max = 0
+        return True
+
+    def stats(self):
+        # events, average and max latency in us since the last reset
+        events = self.events if self.events > 0 else 1
+        return self.events, self.latency_us // events, self.max_latency_us
+
+    def reset_stats(self):
+        self.events = 0
+        self.latency_us = 0
+        self.max_latency_us = 0
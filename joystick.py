@@ -0,0 +1,103 @@
+ADC_MAX = 65535
+LUT_SIZE = 33
+
+
+def acceleration_curve(max_speed = 700, exponent = 2.0, min_speed = 20, size = LUT_SIZE):
+    # pointer speed for each deflection step in 1/256 px per ms, built once so the scan loop stays integer only
+    lut = []
+    for i in range(size):
+        speed = min_speed + (max_speed - min_speed) * (i / (size - 1)) ** exponent # px per second
+        lut.append(int(speed * 256 / 1000))
+    return lut
+
+
+class Axis(object):
+    # oversampled, median-of-3 and low-pass filtered adc axis with a self-calibrating centre and dead zone
+    def __init__(self, pin, curve, samples = 4, smoothing = 1, min_dead_zone = 1024):
+        self.pin = pin
+        self.curve = curve
+        self.samples = samples
+        self.smoothing = smoothing # low-pass shift, new = old + (sample - old) >> smoothing
+        self.min_dead_zone = min_dead_zone
+        self.s0 = 0
+        self.s1 = 0
+        self.value = 0
+        self.center = ADC_MAX // 2
+        self.dead_zone = min_dead_zone
+        self.span = ADC_MAX // 2 - min_dead_zone
+        self.acc = 0 # sub-pixel remainder in 1/256 px
+        self.deflected = False
+        self.calibrate()
+
+    def sample(self):
+        total = 0
+        for _ in range(self.samples):
+            total += self.pin.value
+        return total // self.samples
+
+    def calibrate(self, samples = 32):
+        # the stick is assumed at rest: centre is the mean, dead zone twice the noise seen
+        low = ADC_MAX
+        high = 0
+        total = 0
+        for _ in range(samples):
+            v = self.sample()
+            total += v
+            if v < low:
+                low = v
+            if v > high:
+                high = v
+        self.center = total // samples
+        noise = (high - low) * 2
+        self.dead_zone = noise if noise > self.min_dead_zone else self.min_dead_zone
+        span = self.center if self.center < ADC_MAX - self.center else ADC_MAX - self.center
+        self.span = span - self.dead_zone if span > 2 * self.dead_zone else self.dead_zone
+        self.s0 = self.center
+        self.s1 = self.center
+        self.value = self.center
+        self.acc = 0
+
+    def read(self):
+        v = self.sample()
+        a = self.s0
+        b = self.s1
+        self.s0 = b
+        self.s1 = v
+        if a > b: # median of the last three
+            a, b = b, a
+        m = b if v > b else (v if v > a else a)
+        self.value += (m - self.value) >> self.smoothing
+        return self.value
+
+    def move(self, elapsed):
+        # whole pixels to move for elapsed ms, the fraction is kept for the next call
+        d = self.read() - self.center
+        magnitude = d if d > 0 else -d
+        self.deflected = magnitude > self.dead_zone
+        if not self.deflected:
+            self.center += (self.value - self.center) >> 4 # follow slow drift while at rest
+            self.acc = 0
+            return 0
+        magnitude -= self.dead_zone
+        if magnitude > self.span:
+            self.span = magnitude # the stick reaches further than the centre suggested
+        speed = self.curve[magnitude * (len(self.curve) - 1) // self.span] * elapsed
+        self.acc += speed if d > 0 else -speed
+        pixels = self.acc >> 8 if self.acc >= 0 else -(-self.acc >> 8) # toward zero, the remainder keeps its sign
+        self.acc -= pixels << 8
+        return pixels
+
+
+class Joystick(object):
+    def __init__(self, x_pin, y_pin, max_speed = 700, exponent = 2.0, samples = 4):
+        curve = acceleration_curve(max_speed, exponent)
+        self.x = Axis(x_pin, curve, samples)
+        self.y = Axis(y_pin, curve, samples)
+        self.dx = 0
+        self.dy = 0
+
+    def update(self, elapsed):
+        # sets dx and dy in pixels, True while the stick is off-centre
+        self.dx = self.x.move(elapsed)
+        self.dy = self.y.move(elapsed)
+        return self.x.deflected or self.y.deflected
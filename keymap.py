@@ -0,0 +1,334 @@
+from array import array
+
+from common import ticks_diff
+
+# an action is a 16 bit int, kind in the top 4 bits and its argument below,
+# a plain keycode is an action of kind KEY
+KEY = 0
+CONSUMER = 1
+MOMENTARY = 2
+TOGGLE = 3
+ONE_SHOT = 4
+TAP_HOLD = 5
+COMBO = 6
+MACRO = 7
+_ARG = 0xFFF
+_LAYER = 0x100 # one-shot argument flag, a layer instead of a keycode
+_TRANSPARENT = 0xFFFF # table entry of a transparent key on a layer above the base
+MAX_COMBO_KEYS = 4
+
+NO = 0 # no action, blocks the layers below
+TRANSPARENT = None # use the layer below
+
+# keycodes past the HID range for keys that drive the mouse, handled by the scanner's output
+MOUSE_LEFT = 200
+MOUSE_RIGHT = 201
+MOUSE_UP = 202
+MOUSE_DOWN = 203
+MOUSE_MIDDLE = 204
+
+
+def consumer(code):
+    return CONSUMER << 12 | code
+
+
+def momentary(layer):
+    return MOMENTARY << 12 | layer
+
+
+def toggle(layer):
+    return TOGGLE << 12 | layer
+
+
+def macro(n):
+    # plays the n-th macro file, see macro.py
+    return MACRO << 12 | n
+
+
+def one_shot(keycode):
+    # modifier held for the next key only, or held as long as the key when used with other keys
+    return ONE_SHOT << 12 | keycode
+
+
+def one_shot_layer(layer):
+    return ONE_SHOT << 12 | _LAYER | layer
+
+
+class TapHold(object):
+    def __init__(self, tap, hold, timeout_ms):
+        self.tap = tap
+        self.hold = hold
+        self.timeout_ms = timeout_ms
+
+
+def tap_hold(tap, hold, timeout_ms = 200):
+    # tap action when released before timeout_ms with no other key pressed, hold action otherwise
+    return TapHold(tap, hold, timeout_ms)
+
+
+FN = momentary(1)
+
+
+class Keymap(object):
+    # actions compiled into flat per-layer tables indexed by x * rows + y, a key's index is its column's base
+    # plus its bit in the column bitmask, transparent keys are resolved against the active layers when pressed
+    def __init__(self, rows, cols, tables, tap, hold, timeout, combo_keys, combo_action):
+        self.rows = rows
+        self.cols = cols
+        self.tables = tables
+        self.tap = tap # tap-hold actions, array("H") each
+        self.hold = hold
+        self.timeout = timeout
+        self.combo_keys = combo_keys # bytearray of key indexes per combo
+        self.combo_action = combo_action
+        self.key_combos = [0] * (rows * cols) # bitmask of the combos each key is part of
+        for c in range(len(combo_keys)):
+            for i in combo_keys[c]:
+                self.key_combos[i] |= 1 << c
+
+    def column_masks(self, keycodes):
+        # per column bitmask of the keys that produce one of keycodes on any layer
+        masks = bytearray(self.cols)
+        for table in self.tables:
+            for i in range(len(table)):
+                if table[i] and table[i] in keycodes:
+                    masks[i // self.rows] |= 1 << (i % self.rows)
+        return masks
+
+
+def compile_keymap(keys, combos = ()):
+    # keys is the [y][x] table of actions, a tuple gives one action per layer starting from the base layer and
+    # missing layers are transparent; combos is a list of ([(y, x), ...], action) pressed together
+    rows = len(keys)
+    cols = len(keys[0])
+    layers = 1
+    for row in keys:
+        for key in row:
+            if isinstance(key, tuple) and len(key) > layers:
+                layers = len(key)
+    tap_holds = []
+
+    def encode(action):
+        if isinstance(action, TapHold):
+            tap_holds.append(action)
+            return TAP_HOLD << 12 | (len(tap_holds) - 1)
+        return action
+
+    tables = []
+    for layer in range(layers):
+        table = array("H", [0] * (rows * cols))
+        for y in range(rows):
+            for x in range(cols):
+                key = keys[y][x]
+                if isinstance(key, tuple):
+                    key = key[layer] if layer < len(key) else TRANSPARENT
+                elif layer > 0:
+                    key = TRANSPARENT
+                i = x * rows + y
+                if key is TRANSPARENT:
+                    table[i] = _TRANSPARENT if layer > 0 else NO
+                else:
+                    table[i] = encode(key)
+        tables.append(table)
+    combo_keys = [bytearray(x * rows + y for y, x in positions) for positions, action in combos]
+    combo_action = array("H", [encode(action) for positions, action in combos])
+    return Keymap(rows, cols, tables,
+        array("H", [t.tap for t in tap_holds]), array("H", [t.hold for t in tap_holds]), array("H", [t.timeout_ms for t in tap_holds]),
+        combo_keys, combo_action)
+
+
+class KeymapEngine(object):
+    # turns key index presses and releases into key, consumer and layer actions,
+    # output needs key_down(keycode), key_up(keycode), consumer(code) and macro(n)
+    def __init__(self, keymap, output, combo_ms = 50):
+        self.keymap = keymap
+        self.output = output
+        self.combo_ms = combo_ms
+        self.layer_state = 1 # bitmask of the active layers, the base layer is always on
+        self.top = 0
+        self.active = array("H", [0] * (keymap.rows * keymap.cols)) # action each held key pressed
+        self.tap_key = -1 # tap-hold key waiting for its tap or hold decision
+        self.tap_at = 0
+        self.one_shot = 0 # one-shot action waiting for the next key
+        self.one_shot_key = -1 # one-shot key while held
+        self.one_shot_used = False # another key went down while the one-shot key was held
+        self.one_shot_target = -1 # the key the one-shot applies to, released together with it
+        self.combo_buffer = bytearray(MAX_COMBO_KEYS)
+        self.combo_count = 0
+        self.combo_at = 0
+        self.combo_candidates = 0
+        self.combos_down = 0
+
+    def tick(self, now):
+        if self.tap_key >= 0 and ticks_diff(now, self.tap_at) >= self.keymap.timeout[self.active[self.tap_key] & _ARG]:
+            self.resolve_hold()
+        if self.combo_count and ticks_diff(now, self.combo_at) >= self.combo_ms:
+            self.flush_combo(now)
+
+    def press(self, i, now):
+        combos = self.keymap.key_combos[i]
+        if self.combo_count:
+            candidates = self.combo_candidates & combos
+            if candidates and self.combo_count < MAX_COMBO_KEYS:
+                self.combo_buffer[self.combo_count] = i
+                self.combo_count += 1
+                self.combo_candidates = candidates
+                self.fire_combo()
+                return
+            self.flush_combo(now)
+        if combos:
+            self.combo_buffer[0] = i
+            self.combo_count = 1
+            self.combo_candidates = combos
+            self.combo_at = now
+            return
+        self.press_key(i, now)
+
+    def release(self, i, now):
+        if self.combo_count:
+            for n in range(self.combo_count):
+                if self.combo_buffer[n] == i:
+                    self.flush_combo(now)
+                    break
+        action = self.active[i]
+        self.active[i] = 0
+        if i == self.tap_key: # released before the timeout and before any other key: a tap
+            self.tap_key = -1
+            tap = self.keymap.tap[action & _ARG]
+            self.action_down(tap, i, now)
+            self.action_up(tap, i)
+        elif action >> 12 == COMBO:
+            bit = 1 << (action & _ARG)
+            if self.combos_down & bit: # the first of its keys to go up releases the combo
+                self.combos_down &= ~bit
+                self.action_up(self.keymap.combo_action[action & _ARG], i)
+        elif action:
+            self.action_up(action, i)
+        if i == self.one_shot_target:
+            self.one_shot_target = -1
+            self.one_shot_release()
+
+    def press_key(self, i, now):
+        if self.tap_key >= 0:
+            self.resolve_hold() # another key while a tap-hold key is down makes it a hold
+        if self.one_shot_key >= 0:
+            self.one_shot_used = True
+        action = self.lookup(i)
+        self.active[i] = action
+        if self.one_shot and self.one_shot_target < 0 and action >> 12 != ONE_SHOT:
+            self.one_shot_target = i # the key a pending one-shot applies to
+        self.action_down(action, i, now)
+
+    def lookup(self, i):
+        # action of key i on the highest active layer that does not pass it through
+        tables = self.keymap.tables
+        state = self.layer_state
+        layer = self.top
+        while layer > 0:
+            if state >> layer & 1:
+                action = tables[layer][i]
+                if action != _TRANSPARENT:
+                    return action
+            layer -= 1
+        return tables[0][i]
+
+    def resolve_hold(self):
+        i = self.tap_key
+        self.tap_key = -1
+        hold = self.keymap.hold[self.active[i] & _ARG]
+        self.active[i] = hold
+        self.action_down(hold, i, self.tap_at)
+
+    def fire_combo(self):
+        keymap = self.keymap
+        c = 0
+        candidates = self.combo_candidates
+        while candidates:
+            if candidates & 1 and len(keymap.combo_keys[c]) == self.combo_count:
+                self.combo_count = 0
+                for i in keymap.combo_keys[c]:
+                    self.active[i] = COMBO << 12 | c
+                self.combos_down |= 1 << c
+                self.action_down(keymap.combo_action[c], -1, self.combo_at)
+                return
+            candidates >>= 1
+            c += 1
+
+    def flush_combo(self, now):
+        # no combo matched, the buffered keys are ordinary presses in the order they came
+        count = self.combo_count
+        self.combo_count = 0
+        for n in range(count):
+            self.press_key(self.combo_buffer[n], now)
+
+    def action_down(self, action, i, now):
+        kind = action >> 12
+        arg = action & _ARG
+        if kind == KEY:
+            if arg:
+                self.output.key_down(arg)
+        elif kind == CONSUMER:
+            self.output.consumer(arg)
+        elif kind == MACRO:
+            self.output.macro(arg)
+        elif kind == MOMENTARY:
+            self.layer_on(arg)
+        elif kind == TOGGLE:
+            self.layer_state ^= 1 << arg
+            self.update_top()
+        elif kind == TAP_HOLD:
+            self.tap_key = i
+            self.tap_at = now
+        elif kind == ONE_SHOT:
+            if self.one_shot: # tapped again before use: drop the pending one
+                self.one_shot_release()
+            self.one_shot_key = i
+            self.one_shot_used = False
+            if arg & _LAYER:
+                self.layer_on(arg & 0xFF)
+            else:
+                self.output.key_down(arg)
+
+    def action_up(self, action, i):
+        kind = action >> 12
+        arg = action & _ARG
+        if kind == KEY:
+            if arg:
+                self.output.key_up(arg)
+        elif kind == MOMENTARY:
+            self.layer_off(arg)
+        elif kind == ONE_SHOT:
+            self.one_shot_key = -1
+            if self.one_shot_used: # used like a plain modifier or layer key
+                self.one_shot = action
+                self.one_shot_release()
+            else:
+                self.one_shot = action # stays down until the next key is released
+
+    def one_shot_release(self):
+        arg = self.one_shot & _ARG
+        self.one_shot = 0
+        if arg & _LAYER:
+            self.layer_off(arg & 0xFF)
+        else:
+            self.output.key_up(arg)
+
+    def layer_on(self, layer):
+        self.layer_state |= 1 << layer
+        self.update_top()
+
+    def layer_off(self, layer):
+        self.layer_state &= ~(1 << layer)
+        self.layer_state |= 1
+        self.update_top()
+
+    def update_top(self):
+        top = 0
+        state = self.layer_state >> 1
+        layer = 1
+        while state:
+            if state & 1:
+                top = layer
+            state >>= 1
+            layer += 1
+        self.top = top if top < len(self.keymap.tables) else len(self.keymap.tables) - 1
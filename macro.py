@@ -0,0 +1,87 @@
+from adafruit_hid.keycode import Keycode
+
+from events import KEY_DOWN, KEY_UP
+
+# macro files are typed as text, with a few escapes:
+#   {ENTER}  tap a key by its Keycode name
+#   {+LEFT_CONTROL}  {-LEFT_CONTROL}  hold and release a key
+#   {250}  pause 250 ms
+#   {{  a literal {
+# a newline in the file types ENTER, so end the file without one to avoid it
+_BRACE = 0x7B
+_CLOSE = 0x7D
+_TOKEN_SIZE = 24
+
+
+class MacroReader(object):
+    # reads a macro file chunk by chunk, so its length is only limited by the flash
+    def __init__(self, layout, chunk_size = 64):
+        self.layout = layout
+        self.chunk = bytearray(chunk_size)
+        self.token = bytearray(_TOKEN_SIZE)
+        self.file = None
+        self.size = 0
+        self.pos = 0
+
+    def open(self, path):
+        self.close()
+        self.file = open(path, "rb")
+        self.size = 0
+        self.pos = 0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def read(self):
+        # next byte, -1 at the end of the file
+        if self.pos >= self.size:
+            self.size = self.file.readinto(self.chunk) or 0
+            self.pos = 0
+            if self.size == 0:
+                return -1
+        b = self.chunk[self.pos]
+        self.pos += 1
+        return b
+
+    def step(self, events):
+        # posts the events of the next character or escape, returns the extra pause in ms, or -1 at the end
+        b = self.read()
+        if b < 0:
+            return -1
+        if b == _BRACE:
+            b = self.read()
+            if b != _BRACE:
+                return self.escape(b, events)
+        if b >= 0x80: # the layout only knows ascii, utf-8 sequences are skipped
+            return 0
+        keycodes = self.layout.keycodes(chr(b))
+        for keycode in keycodes:
+            events.post(KEY_DOWN, keycode)
+        for keycode in keycodes:
+            events.post(KEY_UP, keycode)
+        return 0
+
+    def escape(self, b, events):
+        n = 0
+        while b >= 0 and b != _CLOSE:
+            if n < _TOKEN_SIZE:
+                self.token[n] = b
+                n += 1
+            b = self.read()
+        if n == 0:
+            return 0
+        first = self.token[0]
+        if 0x30 <= first <= 0x39: # {250}
+            return int(bytes(self.token[:n]))
+        start = 1 if first == 0x2B or first == 0x2D else 0 # + or -
+        keycode = getattr(Keycode, bytes(self.token[start:n]).decode(), 0)
+        if not keycode:
+            print("macro: unknown key %s" % bytes(self.token[:n]).decode())
+            return 0
+        if first != 0x2D:
+            events.post(KEY_DOWN, keycode)
+        if first != 0x2B:
+            events.post(KEY_UP, keycode)
+        return 0
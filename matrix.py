@@ -0,0 +1,155 @@
+machine = None
+try:
+    import machine
+except:
+    pass
+micropython = None
+try:
+    import micropython
+except:
+    pass
+
+SIO_GPIO_IN = 0xd0000004 # rp2040 SIO register holding the level of every gpio
+ALL = -2 # every column driven at once
+
+
+def port_reader(row_gpios):
+    # one register read for all rows when they sit on consecutive gpios and raw memory access exists
+    if machine is None or not hasattr(machine, "mem32"):
+        return None
+    first = row_gpios[0]
+    for i in range(len(row_gpios)):
+        if row_gpios[i] != first + i:
+            return None
+    mask = (1 << len(row_gpios)) - 1
+
+    def read_rows():
+        return (~machine.mem32[SIO_GPIO_IN] >> first) & mask # rows are pulled up, pressed reads low
+
+    return read_rows
+
+
+def emitters(port):
+    # code emitters to try for the generated scan, fastest first, plain bytecode always works
+    names = []
+    if micropython and port and hasattr(micropython, "viper"):
+        names.append("viper") # direct register loads through ptr32
+    if micropython and hasattr(micropython, "native"):
+        names.append("native")
+    names.append(None)
+    return names
+
+
+def scan_source(cols, rows, first, emitter):
+    # straight-line reads of every column into raw[x], entered with column 0 driven and left with the last one
+    # driven, pins are bound as locals through default arguments (globals for viper)
+    mask = (1 << rows) - 1
+    pins = "".join(", c%d = c%d" % (x, x) for x in range(cols))
+    if emitter == "viper":
+        lines = ["@micropython.viper", "def scan_columns(raw: ptr8):", "    port = ptr32(0x%x)" % SIO_GPIO_IN]
+        read = "((port[0] >> %d) & %d) ^ %d" % (first, mask, mask) # pressed reads low
+    elif first is not None:
+        lines = ["def scan_columns(raw, mem = mem32%s):" % pins]
+        read = "(~mem[0x%x] >> %d) & %d" % (SIO_GPIO_IN, first, mask)
+    else:
+        lines = ["def scan_columns(raw%s%s):" % (pins, "".join(", r%d = r%d" % (y, y) for y in range(rows)))]
+        read = " | ".join("(0 if r%d.value else %d)" % (y, 1 << y) for y in range(rows))
+    if emitter == "native":
+        lines.insert(0, "@micropython.native")
+    for x in range(cols):
+        if x:
+            lines.append("    c%d.value = True" % (x - 1))
+            lines.append("    c%d.value = False" % x)
+        lines.append("    raw[%d] = %s" % (x, read))
+    return "\n".join(lines) + "\n"
+
+
+class MatrixScanner(object):
+    # keeps exactly one column driven low, switching columns costs two pin writes,
+    # or all of them low for the idle check
+    def __init__(self, x_lines, y_lines, row_gpios = None):
+        self.x_lines = x_lines
+        self.y_lines = y_lines
+        for line in x_lines:
+            line.value = True # disable all lines
+        self.current = -1
+        self.read_rows = None
+        if row_gpios:
+            self.read_rows = port_reader(row_gpios)
+        self.port = self.read_rows is not None
+        if self.read_rows is None:
+            self.read_rows = self.read_row_pins
+        self.row_gpios = row_gpios
+        self.scan_columns = None # generated by unroll()
+        self.emitter = None
+
+    def select(self, x):
+        if self.current == ALL:
+            for line in self.x_lines:
+                line.value = True
+        elif self.current >= 0:
+            self.x_lines[self.current].value = True # disable previous line
+        self.x_lines[x].value = False # scan x line
+        self.current = x
+
+    def select_all(self):
+        if self.current != ALL:
+            for line in self.x_lines:
+                line.value = False
+            self.current = ALL
+
+    def any_pressed(self):
+        # rows bitmask of all columns together, stays in this mode while idle so it costs a single read
+        self.select_all()
+        return self.read_rows()
+
+    def scan(self, raw):
+        # rows bitmask of every column into raw[x]
+        if self.scan_columns:
+            self.select(0)
+            self.scan_columns(raw)
+            self.current = len(self.x_lines) - 1
+            return
+        for x in range(len(self.x_lines)):
+            self.select(x)
+            raw[x] = self.read_rows()
+
+    def unroll(self):
+        # generates the straight-line scan for this board, with the fastest emitter that compiles and reads
+        # the same rows as the generic loop, the generic loop stays in use when none does
+        cols = len(self.x_lines)
+        rows = len(self.y_lines)
+        first = self.row_gpios[0] if self.port else None
+        expected = bytearray(cols)
+        raw = bytearray(cols)
+        self.scan(expected)
+        for emitter in emitters(self.port):
+            scope = {"micropython": micropython}
+            for x in range(cols):
+                scope["c%d" % x] = self.x_lines[x]
+            for y in range(rows):
+                scope["r%d" % y] = self.y_lines[y]
+            if self.port:
+                scope["mem32"] = machine.mem32
+            try:
+                exec(scan_source(cols, rows, first, emitter), scope)
+                self.scan_columns = scope["scan_columns"]
+                self.scan(raw)
+            except Exception as e:
+                print("unrolled scan %s: %s" % (emitter, e))
+                self.scan_columns = None
+                continue
+            if raw == expected:
+                self.emitter = emitter
+                return True
+            self.scan_columns = None
+        return False
+
+    def read_row_pins(self):
+        bits = 0
+        y = 0
+        for line in self.y_lines:
+            if not line.value: # pressed
+                bits |= 1 << y
+            y += 1
+        return bits
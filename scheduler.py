@@ -1,6 +1,16 @@
 import gc
+thread = None
+try:
+    import _thread as thread
+except:
+    pass
 
-from common import ticks_ms, ticks_add, ticks_diff, sleep_ms
+from common import ticks_ms, ticks_us, ticks_add, ticks_diff, sleep_ms
+
+# mailbox overflow policies
+DROP_OLDEST = 0
+DROP_NEWEST = 1
+BLOCK = 2
 
 
 class Message(object):
@@ -9,6 +19,154 @@ class Message(object):
         self.sender = sender
         self.sender_name = sender_name
         self.receiver = receiver
+        self.stamp = 0 # ticks_us when taken from a pool that stamps, else 0
+        self.pool = None
+        self.prev = None # mailbox links
+        self.next = None
+        self.sender_next = None
+
+    def release(self):
+        if self.pool:
+            self.pool.release(self)
+
+
+class MessagePool(object):
+    # preallocated messages, receivers hand them back with msg.release()
+    def __init__(self, size = 8, lock = None, stamp = False):
+        self.size = size
+        self.free = [Message(None) for _ in range(size)]
+        self.top = size
+        self.misses = 0
+        self.lock = lock # set when messages are released on another core
+        self.stamp = stamp # only while profiling, ticks_us() allocates a long int on CircuitPython
+
+    def acquire(self, content, receiver = None):
+        msg = None
+        if self.lock:
+            self.lock.acquire()
+        if self.top > 0:
+            self.top -= 1
+            msg = self.free[self.top]
+            self.free[self.top] = None
+        if self.lock:
+            self.lock.release()
+        if msg is None:
+            msg = Message(None)
+            self.misses += 1
+        msg.pool = self
+        msg.content = content
+        msg.sender = None
+        msg.sender_name = ""
+        msg.receiver = receiver
+        msg.stamp = ticks_us() if self.stamp else 0
+        return msg
+
+    def release(self, msg):
+        msg.content = None
+        if self.lock:
+            self.lock.acquire()
+        if self.top < self.size:
+            self.free[self.top] = msg
+            self.top += 1
+        if self.lock:
+            self.lock.release()
+
+
+class Mailbox(object):
+    # bounded FIFO of messages linked through the messages themselves,
+    # with a per-sender chain so receive by sender and readiness checks are O(1)
+    def __init__(self, size = 16, overflow = DROP_OLDEST):
+        self.size = size
+        self.overflow = overflow
+        self.head = None
+        self.tail = None
+        self.count = 0
+        self.dropped = 0
+        self.sender_first = {}
+        self.sender_last = {}
+
+    def __len__(self):
+        return self.count
+
+    def full(self):
+        return self.count >= self.size
+
+    def has(self, sender):
+        return self.sender_first.get(sender) is not None
+
+    def put(self, msg):
+        if self.count >= self.size:
+            self.dropped += 1
+            if self.overflow != DROP_OLDEST:
+                return False
+            self.get().release()
+        msg.prev = self.tail
+        msg.next = None
+        msg.sender_next = None
+        if self.tail is None:
+            self.head = msg
+        else:
+            self.tail.next = msg
+        self.tail = msg
+        last = self.sender_last.get(msg.sender)
+        if last is None:
+            self.sender_first[msg.sender] = msg
+        else:
+            last.sender_next = msg
+        self.sender_last[msg.sender] = msg
+        self.count += 1
+        return True
+
+    def get(self, sender = None):
+        if sender is None:
+            msg = self.head
+        else:
+            msg = self.sender_first.get(sender)
+        if msg is None:
+            return None
+        if msg.prev is None:
+            self.head = msg.next
+        else:
+            msg.prev.next = msg.next
+        if msg.next is None:
+            self.tail = msg.prev
+        else:
+            msg.next.prev = msg.prev
+        # the oldest message overall is also the oldest one of its sender
+        self.sender_first[msg.sender] = msg.sender_next
+        if msg.sender_next is None:
+            self.sender_last[msg.sender] = None
+        msg.prev = None
+        msg.next = None
+        msg.sender_next = None
+        self.count -= 1
+        return msg
+
+
+class Channel(object):
+    # lock protected message queue into a scheduler running on another core
+    def __init__(self, size = 32):
+        self.queue = Mailbox(size, DROP_NEWEST)
+        self.lock = thread.allocate_lock() if thread else None
+
+    def __len__(self):
+        return self.queue.count
+
+    def put(self, msg):
+        if self.lock:
+            self.lock.acquire()
+        ok = self.queue.put(msg)
+        if self.lock:
+            self.lock.release()
+        return ok
+
+    def get(self):
+        if self.lock:
+            self.lock.acquire()
+        msg = self.queue.get()
+        if self.lock:
+            self.lock.release()
+        return msg
 
 
 class Condition(object):
@@ -17,8 +175,118 @@ class Condition(object):
         self.resume_at = ticks_add(ticks_ms(), sleep) # ms
         self.send_msgs = send_msgs
         self.wait_msg = wait_msg
+
+    def reset(self, code = 0, sleep = 0, send_msgs = [], wait_msg = False):
+        self.code = code
+        self.resume_at = ticks_add(ticks_ms(), sleep) # ms
+        self.send_msgs = send_msgs
+        self.wait_msg = wait_msg
+        return self
         
         
+class TaskStats(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.run_us = 0
+        self.max_run_us = 0
+        self.late_ms = 0
+        self.max_late_ms = 0
+        self.msgs_sent = 0
+        self.msgs_recv = 0
+
+    def record(self, run_us, late_ms):
+        self.steps += 1
+        self.run_us += run_us
+        if run_us > self.max_run_us:
+            self.max_run_us = run_us
+        self.late_ms += late_ms
+        if late_ms > self.max_late_ms:
+            self.max_late_ms = late_ms
+
+
+class Cadence(object):
+    # interval of a polling task that follows activity: fast while active, back to slow after quiet_ms without any
+    def __init__(self, fast = 1, slow = 50, quiet_ms = 1000, ramp = 0, decay = 2):
+        self.fast = fast
+        self.slow = slow
+        self.quiet_ms = quiet_ms
+        self.ramp = ramp # interval divisor per active step, 0 jumps straight to fast
+        self.decay = decay # interval multiplier per quiet step, 0 jumps straight to slow
+        self.interval = slow
+        self.active_at = ticks_ms()
+
+    def update(self, active, now = None):
+        if now is None:
+            now = ticks_ms()
+        if active:
+            self.active_at = now
+            if self.ramp > 1 and self.interval // self.ramp > self.fast:
+                self.interval //= self.ramp
+            else:
+                self.interval = self.fast
+        elif self.interval < self.slow and ticks_diff(now, self.active_at) >= self.quiet_ms:
+            interval = self.interval * self.decay if self.interval else 1
+            if self.decay > 1 and interval < self.slow:
+                self.interval = interval
+            else:
+                self.interval = self.slow
+        return self.interval
+
+
+def mem_alloc():
+    return gc.mem_alloc() if hasattr(gc, "mem_alloc") else 0
+
+
+class GcPolicy(object):
+    # full collections run by the scheduler in idle gaps long enough for them, MicroPython and CircuitPython
+    # have no incremental collector so the gap has to fit a whole one
+    def __init__(self, budget = 8192, threshold = 16384, max_interval_ms = 2000, min_gap_ms = 2):
+        self.budget = budget # bytes allocated since the last collection that make one due
+        self.max_interval_ms = max_interval_ms # due anyway after this long, the only trigger without gc.mem_alloc
+        self.min_gap_ms = min_gap_ms
+        self.collect_at = ticks_ms()
+        self.alloc_at = mem_alloc()
+        self.count = 0
+        self.pause_us = 0
+        self.max_pause_us = 0
+        self.deferred = 0 # idle gaps passed up while a task was active
+        self.auto = 0 # collections the runtime ran on its own, seen as a drop in allocated memory
+        if threshold and hasattr(gc, "threshold"):
+            gc.threshold(threshold) # the runtime collects past this on its own, a backstop for long busy stretches
+
+    def gap_ms(self):
+        # idle time a collection needs, from the longest pause seen so far
+        gap = self.max_pause_us // 1000 + 1
+        return gap if gap > self.min_gap_ms else self.min_gap_ms
+
+    def allocated(self):
+        alloc = mem_alloc()
+        if alloc < self.alloc_at:
+            self.auto += 1
+            self.alloc_at = alloc
+        return alloc - self.alloc_at
+
+    def due(self, now):
+        return self.allocated() >= self.budget or ticks_diff(now, self.collect_at) >= self.max_interval_ms
+
+    def overdue(self):
+        return self.allocated() >= 2 * self.budget
+
+    def collect(self):
+        t = ticks_us()
+        gc.collect()
+        pause = ticks_diff(ticks_us(), t)
+        self.count += 1
+        self.pause_us += pause
+        if pause > self.max_pause_us:
+            self.max_pause_us = pause
+        self.collect_at = ticks_ms()
+        self.alloc_at = mem_alloc()
+
+
 class Task(object):
     id_count = 0
     
@@ -27,82 +295,302 @@ class Task(object):
         cls.id_count += 1
         return cls.id_count
     
-    def __init__(self, func, name, condition = Condition(), task_id = None, args = [], kwargs = {}):
+    def __init__(self, func, name, condition = None, task_id = None, args = [], kwargs = {}, mailbox_size = 16, overflow = DROP_OLDEST):
         self.id = Task.new_id()
         if task_id:
             self.id = task_id
         self.name = name
-        self.msgs = []
-        self.msgs_senders = []
+        self.mailbox = Mailbox(mailbox_size, overflow)
+        self.scheduler = None
+        self.send_index = 0
+        self.stats = TaskStats()
+        self.cadence = None # set by tasks that adapt their interval, reported by task_rates()
+        self.cond = Condition() # reused by sleep() and wait()
         self.func = func(self, name, *args, **kwargs)
-        self.condition = condition
+        self.condition = condition if condition else Condition() # not a shared default, its resume_at would be from import time
         
     def set_condition(self, condition):
         self.condition = condition
+
+    def set_cadence(self, cadence):
+        self.cadence = cadence
+
+    def sleep(self, ms = 0, send_msgs = []):
+        return self.cond.reset(sleep = ms, send_msgs = send_msgs)
+
+    def wait(self, sender = True, ms = 0, send_msgs = []):
+        return self.cond.reset(sleep = ms, send_msgs = send_msgs, wait_msg = sender)
         
     def put_message(self, message):
-        self.msgs.append(message)
-        self.msgs_senders.append(message.sender)
+        if not self.mailbox.put(message):
+            return False
+        if self.scheduler:
+            self.scheduler.wake(self)
+        return True
         
     def get_message(self, sender = None):
-        msg = None
-        if sender is None:
-            msg = self.msgs.pop(0)
-            _ = self.msgs_senders.pop(0)
-        else:
-            i = self.msgs_senders.index(sender)
-            msg = self.msgs.pop(i)
-            _ = self.msgs_senders.pop(i)
+        msg = self.mailbox.get(sender)
+        if msg:
+            self.stats.msgs_recv += 1
+        if self.scheduler and self.scheduler.blocked:
+            self.scheduler.unblock(self)
         return msg
         
+    def has_message(self, sender = True):
+        if sender is True:
+            return self.mailbox.count > 0
+        return self.mailbox.has(sender)
+
     def ready(self):
         if ticks_diff(ticks_ms(), self.condition.resume_at) >= 0:
-            if self.condition.wait_msg is True:
-                return len(self.msgs) > 0
-            elif self.condition.wait_msg >= 1:
-                return self.condition.wait_msg in self.msgs_senders
+            if self.condition.wait_msg:
+                return self.has_message(self.condition.wait_msg)
             else:
                 return True
         else:
             return False
 
 
+class TimerQueue(object):
+    # binary min-heap of tasks keyed on condition.resume_at, ties run in push order
+    def __init__(self):
+        self.heap = []
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def before(self, a, b):
+        diff = ticks_diff(a.condition.resume_at, b.condition.resume_at)
+        if diff == 0:
+            return ticks_diff(a.seq, b.seq) < 0
+        return diff < 0
+
+    def push(self, task):
+        self.seq = ticks_add(self.seq, 1) # wraps like ticks so it stays a small int
+        task.seq = self.seq
+        heap = self.heap
+        heap.append(task)
+        self.sift_up(len(heap) - 1)
+
+    def peek(self):
+        return self.heap[0]
+
+    def pop(self):
+        heap = self.heap
+        last = heap.pop()
+        if not heap:
+            return last
+        task = heap[0]
+        heap[0] = last
+        self.sift_down(0)
+        return task
+
+    def remove(self, task):
+        heap = self.heap
+        for i in range(len(heap)):
+            if heap[i] is task:
+                last = heap.pop()
+                if i < len(heap):
+                    heap[i] = last
+                    self.sift_down(i)
+                    self.sift_up(i)
+                return True
+        return False
+
+    def sift_up(self, i):
+        heap = self.heap
+        task = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if self.before(task, heap[parent]):
+                heap[i] = heap[parent]
+                i = parent
+            else:
+                break
+        heap[i] = task
+
+    def sift_down(self, i):
+        heap = self.heap
+        size = len(heap)
+        task = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and self.before(heap[child + 1], heap[child]):
+                child += 1
+            if self.before(heap[child], task):
+                heap[i] = heap[child]
+                i = child
+            else:
+                break
+        heap[i] = task
+
+
 class Scheluder(object):
-    def __init__(self, log_to = None, name = "scheduler", cpu = 0):
+    def __init__(self, log_to = None, name = "scheduler", cpu = 0, tickless = True, pool_size = 8, profile = False):
         self.log_to = log_to
         self.cpu = cpu
         self.name = name
-        self.tasks = []
+        self.tasks = TimerQueue()
+        self.waiting = {}
+        self.blocked = {} # receiver id -> senders waiting for room in its mailbox
+        self.msg_pool = MessagePool(pool_size, stamp = profile)
+        self.inbox = None # Channel, set by connect()
+        self.peers = []
         self.tasks_ids = {}
-        self.task_sort_at = 0
         self.current = None
         self.sleep_ms = 0
         self.load_calc_at = ticks_ms()
         self.idle = 0
         self.idle_sleep_interval = 0.1
         self.task_sleep_interval = 0.1
-        self.need_to_sort = True
+        self.tickless = tickless
+        self.profile = profile
+        self.load_calc_interval = 1000
+        self.wake_check_interval = 0 # ms, > 0 when messages can arrive while sleeping
+        self.woken = False
         self.stop = False
-        
-    def task_sort(self, task):
-        if task.condition.wait_msg:
-            if len(task.msgs) > 0:
-                return -1000000
-            else:
-                return 1000000
-        return ticks_diff(task.condition.resume_at, self.task_sort_at)
+        self.gc = None # GcPolicy, set by manage_gc()
+
+    def schedule(self, task):
+        wait_msg = task.condition.wait_msg
+        if wait_msg and not task.has_message(wait_msg):
+            self.waiting[task.id] = task # parked until a message it waits for is delivered
+        else:
+            self.tasks.push(task)
+
+    def wake(self, task):
+        if task.id in self.waiting and task.has_message(task.condition.wait_msg):
+            del self.waiting[task.id]
+            self.tasks.push(task)
+            self.woken = True
 
     def add_task(self, task, condition = None):
-        self.tasks.append(task)
+        task.scheduler = self
+        self.schedule(task)
         self.tasks_ids[task.id] = task
         return task.id
 
     def remove_task(self, task):
-        self.tasks.remove(task)
+        if not self.tasks.remove(task):
+            self.waiting.pop(task.id, None)
         del self.tasks_ids[task.id]
+        task.scheduler = None
+        self.unblock(task)
+
+    def send(self, task):
+        # deliver the task's pending send_msgs, False if it has to block on a full mailbox
+        msgs = task.condition.send_msgs
+        while task.send_index < len(msgs):
+            msg = msgs[task.send_index]
+            msg.sender = task.id
+            msg.sender_name = task.name
+            if msg.receiver in self.tasks_ids:
+                receiver = self.tasks_ids[msg.receiver]
+                if not receiver.put_message(msg):
+                    if receiver.mailbox.overflow == BLOCK:
+                        if msg.receiver in self.blocked:
+                            self.blocked[msg.receiver].append(task)
+                        else:
+                            self.blocked[msg.receiver] = [task]
+                        return False
+                    msg.release()
+                else:
+                    task.stats.msgs_sent += 1
+            elif self.peers:
+                if self.send_msg(msg): # cross-core sends never block, a full channel drops
+                    task.stats.msgs_sent += 1
+                else:
+                    msg.release()
+            else:
+                msg.release() # no such receiver, back to the pool
+            task.send_index += 1
+        task.send_index = 0
+        return True
+
+    def unblock(self, receiver):
+        senders = self.blocked.pop(receiver.id, None)
+        if senders:
+            for task in senders:
+                if task.scheduler is self and self.send(task):
+                    self.schedule(task)
         
     def send_msg(self, msg):
-        self.msgs.put(msg)
+        # deliver to a local task, or through the inbox of the scheduler that owns the receiver
+        if msg.receiver in self.tasks_ids:
+            return self.tasks_ids[msg.receiver].put_message(msg)
+        for peer in self.peers:
+            if msg.receiver in peer.tasks_ids:
+                return peer.post(msg)
+        return False
+
+    def post(self, msg):
+        # called from the other core
+        if self.inbox.put(msg):
+            self.woken = True
+            return True
+        return False
+
+    def connect(self, peer, channel_size = 32):
+        # link two schedulers so tasks on either one can message tasks on the other
+        for s in (self, peer):
+            if s.inbox is None:
+                s.inbox = Channel(channel_size)
+            if thread and s.msg_pool.lock is None:
+                s.msg_pool.lock = thread.allocate_lock()
+            s.wake_check_interval = 1
+        self.peers.append(peer)
+        peer.peers.append(self)
+
+    def manage_gc(self, budget = 8192, threshold = 16384, max_interval_ms = 2000, min_gap_ms = 2):
+        # this scheduler runs the collections, in idle gaps and not while a task's cadence is active
+        self.gc = GcPolicy(budget, threshold, max_interval_ms, min_gap_ms)
+
+    def collect_garbage(self, now, wait):
+        # True when a collection ran in the wait ms before the next task
+        policy = self.gc
+        if wait < policy.gap_ms() or not policy.due(now):
+            return False
+        if self.active(now) and not policy.overdue():
+            policy.deferred += 1
+            return False
+        policy.collect()
+        return True
+
+    def active(self, now):
+        # a task with a cadence saw activity within its quiet_ms, keys held or typed a moment ago
+        for task_id in self.tasks_ids:
+            cadence = self.tasks_ids[task_id].cadence
+            if cadence and ticks_diff(now, cadence.active_at) < cadence.quiet_ms:
+                return True
+        return False
+
+    def gc_stats(self):
+        # collections, average and max pause in us, gaps passed up while active, collections the runtime ran itself
+        policy = self.gc
+        if policy is None:
+            return None
+        count = policy.count if policy.count > 0 else 1
+        return policy.count, policy.pause_us // count, policy.max_pause_us, policy.deferred, policy.auto
+
+    def receive_inbox(self):
+        msg = self.inbox.get()
+        while msg:
+            if msg.receiver in self.tasks_ids:
+                if not self.tasks_ids[msg.receiver].put_message(msg):
+                    msg.release()
+            else:
+                msg.release()
+            msg = self.inbox.get()
+
+    def start_thread(self):
+        # on rp2 MicroPython the new thread runs on the second core
+        thread.start_new_thread(self.run, ())
+
+    def message(self, content, receiver = None):
+        return self.msg_pool.acquire(content, receiver)
         
     def mem_free(self):
         return gc.mem_free()
@@ -110,56 +598,104 @@ class Scheluder(object):
     def cpu_idle(self):
         return self.idle
     
+    def idle_wait(self, ms):
+        # sleep until the deadline in one call, or in slices when an early wakeup is possible
+        t = ticks_ms()
+        self.woken = False
+        if self.wake_check_interval > 0:
+            deadline = ticks_add(t, ms)
+            left = ms
+            while left > 0 and not self.woken and not (self.inbox and len(self.inbox)):
+                sleep_ms(left if left < self.wake_check_interval else self.wake_check_interval)
+                left = ticks_diff(deadline, ticks_ms()) # from the clock, a slice can take longer than asked
+        else:
+            sleep_ms(ms)
+        self.sleep_ms += ticks_diff(ticks_ms(), t)
+
+    def task_stats(self):
+        # (id, name, steps, avg run us, max run us, avg late ms, max late ms, msgs sent, msgs received)
+        stats = []
+        for task_id in self.tasks_ids:
+            task = self.tasks_ids[task_id]
+            s = task.stats
+            steps = s.steps if s.steps > 0 else 1
+            stats.append((task.id, task.name, s.steps, s.run_us // steps, s.max_run_us, s.late_ms // steps, s.max_late_ms, s.msgs_sent, s.msgs_recv))
+        return stats
+
+    def task_rates(self):
+        # (id, name, current interval ms) of the tasks with a cadence
+        rates = []
+        for task_id in self.tasks_ids:
+            task = self.tasks_ids[task_id]
+            if task.cadence:
+                rates.append((task.id, task.name, task.cadence.interval))
+        return rates
+
+    def reset_stats(self):
+        for task_id in self.tasks_ids:
+            self.tasks_ids[task_id].stats.reset()
+
     def set_log_to(self, task_id):
         self.log_to = task_id
     
     def log(self, content):
         if self.log_to:
-            self.tasks_ids[self.log_to].put_message(Message(content, sender = 0, sender_name = self.name))
+            msg = self.msg_pool.acquire(content)
+            msg.sender = 0
+            msg.sender_name = self.name
+            if not self.tasks_ids[self.log_to].put_message(msg):
+                msg.release()
         else:
             print(content)
 
     def run(self):
         while not self.stop:
             try:
-                load_interval = ticks_diff(ticks_ms(), self.load_calc_at)
-                if load_interval >= 1000:
-                    self.idle = self.sleep_ms * 100 / load_interval
+                now = ticks_ms()
+                load_interval = ticks_diff(now, self.load_calc_at)
+                if load_interval >= self.load_calc_interval:
+                    self.idle = self.sleep_ms * 100 // load_interval
                     if self.idle > 100:
                         self.idle = 100
                     self.sleep_ms = 0
-                    self.load_calc_at = ticks_ms()
+                    self.load_calc_at = now
+                    load_interval = 0
+                if self.inbox and len(self.inbox):
+                    self.receive_inbox()
                 if self.tasks:
-                    #print(self.tasks)
-                    if self.need_to_sort == True:
-                        self.task_sort_at = ticks_ms()
-                        self.tasks.sort(key = self.task_sort)
-                        self.need_to_sort = False
-                    if self.current is None:
-                        peek = self.tasks[0]
-                        now = ticks_ms()
-                        if peek.ready():
-                            # print("ready: %s" % peek.id)
-                            self.current = self.tasks.pop(0)
-                            try:
+                    peek = self.tasks.peek()
+                    wait = ticks_diff(peek.condition.resume_at, now)
+                    if wait <= 0:
+                        self.current = self.tasks.pop()
+                        try:
+                            if self.profile:
+                                late = 0 if self.current.condition.wait_msg else -wait
+                                t = ticks_us()
                                 self.current.set_condition(next(self.current.func))
-                                self.tasks.append(self.current)
-                                for msg in self.current.condition.send_msgs:
-                                    msg.sender = self.current.id
-                                    msg.sender_name = self.current.name
-                                    if msg.receiver in self.tasks_ids:
-                                        self.tasks_ids[msg.receiver].put_message(msg)
-                                self.current = None
-                                self.need_to_sort = True
-                            except StopIteration:
-                                self.remove_task(self.current)
-                                self.current = None
-                            except Exception as e:
-                                self.log("task: %s: %s" % (self.current.name, str(e)))
-                                self.current = None
-                        else:
-                            sleep_ms(self.task_sleep_interval)
-                            self.sleep_ms += self.task_sleep_interval
+                                self.current.stats.record(ticks_diff(ticks_us(), t), late)
+                            else:
+                                self.current.set_condition(next(self.current.func))
+                            if self.send(self.current):
+                                self.schedule(self.current)
+                            self.current = None
+                        except StopIteration:
+                            self.remove_task(self.current)
+                            self.current = None
+                        except Exception as e:
+                            self.log("task: %s: %s" % (self.current.name, str(e)))
+                            self.current = None
+                    elif self.tickless:
+                        if self.gc and self.collect_garbage(now, wait):
+                            continue
+                        load_left = self.load_calc_interval - load_interval
+                        self.idle_wait(wait if wait < load_left else load_left)
+                    else:
+                        sleep_ms(self.task_sleep_interval)
+                        self.sleep_ms += self.task_sleep_interval
+                elif self.tickless:
+                    if self.gc and self.collect_garbage(now, self.load_calc_interval - load_interval):
+                        continue
+                    self.idle_wait(self.load_calc_interval - load_interval)
                 else:
                     sleep_ms(self.idle_sleep_interval)
                     self.sleep_ms += self.idle_sleep_interval
@@ -0,0 +1,111 @@
+# host-side stand-ins for the CircuitPython hardware modules, so the firmware runs under CPython:
+#   python -m sim pico70 5000 [--virtual]
+# on the wall clock the firmware runs dual core, its core 1 scheduler on a CPython thread
+# or from a script:
+#   hardware = sim.install("pico70"); fw = sim.load_firmware("code.py")
+#   k = fw.CustomKeyBoard(fw.load_board(fw.config_path), events)
+#   hardware.matrix.press(0, 0); k.scan(); hardware.hid.last("keyboard")
+import gc
+import os
+import sys
+import time
+import _thread
+import importlib
+import importlib.util
+
+from sim import hardware as hw
+from sim.hardware import SimulationEnd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAP_SIZE = 264 * 1024
+
+# CircuitPython modules replaced by the simulation
+MODULES = [
+    "board",
+    "digitalio",
+    "analogio",
+    "pwmio",
+    "usb_hid",
+    "supervisor",
+    "micropython",
+    "microcontroller",
+    "adafruit_hid",
+    "adafruit_hid.keycode",
+    "adafruit_hid.keyboard",
+    "adafruit_hid.keyboard_layout_us",
+    "adafruit_hid.mouse",
+    "adafruit_hid.consumer_control",
+    "adafruit_hid.consumer_control_code",
+]
+
+
+def mem_free():
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        return max(0, HEAP_SIZE - tracemalloc.get_traced_memory()[0])
+    return HEAP_SIZE // 2
+
+
+def install(board = "pico70", virtual = None):
+    # register the fake hardware modules, call before importing the firmware,
+    # pass a common.VirtualClock as virtual to fast-forward instead of sleeping
+    hw.reset(board, virtual)
+    os.environ["KEYBOARD_CONFIG"] = board_path(board) # the firmware picks its board profile from it
+    # CPython has _thread, so the firmware puts its second scheduler on a thread of its own, on the wall clock only:
+    # two threads sleeping on one virtual clock would each move the other's time
+    os.environ["KEYBOARD_DUAL_CORE"] = "0" if virtual else "1"
+    for name in MODULES:
+        sys.modules[name] = importlib.import_module("sim." + name)
+    if not hasattr(gc, "mem_free"):
+        gc.mem_free = mem_free
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import common
+    common.set_clock(hw.hardware.clock)
+    if virtual:
+        time.sleep = virtual_sleep # the firmware's own time.sleep() calls advance the virtual clock too
+    else:
+        time.sleep = hw.real_sleep
+    return hw.hardware
+
+
+def board_path(board):
+    return os.path.join(ROOT, "boards", board + ".json")
+
+
+def uninstall():
+    import common
+    common.set_clock(None)
+    time.sleep = hw.real_sleep
+
+
+def virtual_sleep(seconds):
+    hw.hardware.clock.sleep_ms(seconds * 1000)
+
+
+def load_firmware(path = "code.py", name = "firmware"):
+    # import a firmware file as a module without running its __main__ block
+    path = os.path.join(ROOT, path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_firmware(path = "code.py", duration_ms = 3000):
+    # run a firmware file as __main__ until duration_ms of simulated time has passed
+    import runpy
+    clock = hw.hardware.clock
+    clock.deadline = clock.now() + duration_ms
+    threads = _thread._count()
+    try:
+        runpy.run_path(os.path.join(ROOT, path), run_name = "__main__")
+    except SimulationEnd:
+        pass
+    finally:
+        end = time.monotonic() + 1
+        while _thread._count() > threads and time.monotonic() < end: # the core 1 scheduler stops at the deadline too
+            hw.real_sleep(0.001)
+        clock.deadline = None
+    return hw.hardware
@@ -0,0 +1,20 @@
+import sys
+
+import sim
+from common import VirtualClock
+
+
+def main(argv):
+    # python -m sim [pico70|pi5] [duration ms] [--virtual], a board profile from boards/ running code.py
+    virtual = "--virtual" in argv
+    argv = [a for a in argv if a != "--virtual"]
+    board = argv[1] if len(argv) > 1 else "pico70"
+    duration_ms = int(argv[2]) if len(argv) > 2 else 3000
+    hardware = sim.install(board, VirtualClock() if virtual else None)
+    sim.run_firmware("code.py", duration_ms)
+    for device in ("keyboard", "mouse", "consumer_control"):
+        print("%s: %d reports" % (device, len(hardware.hid.of(device))))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,5 @@
+def find_device(devices, usage_page, usage):
+    for device in devices:
+        if device.usage_page == usage_page and device.usage == usage:
+            return device
+    raise ValueError("Could not find matching HID device.")
@@ -0,0 +1,38 @@
+from adafruit_hid.keycode import Keycode as K
+
+_SHIFT = 0x80
+# printable ASCII from 0x20, keycode with the high bit set when shift is needed
+_ASCII = (
+    K.SPACE, _SHIFT | K.ONE, _SHIFT | K.QUOTE, _SHIFT | K.THREE, _SHIFT | K.FOUR, _SHIFT | K.FIVE, _SHIFT | K.SEVEN, K.QUOTE,
+    _SHIFT | K.NINE, _SHIFT | K.ZERO, _SHIFT | K.EIGHT, _SHIFT | K.EQUALS, K.COMMA, K.MINUS, K.PERIOD, K.FORWARD_SLASH,
+    K.ZERO, K.ONE, K.TWO, K.THREE, K.FOUR, K.FIVE, K.SIX, K.SEVEN,
+    K.EIGHT, K.NINE, _SHIFT | K.SEMICOLON, K.SEMICOLON, _SHIFT | K.COMMA, K.EQUALS, _SHIFT | K.PERIOD, _SHIFT | K.FORWARD_SLASH,
+    _SHIFT | K.TWO,
+) + tuple(_SHIFT | (K.A + i) for i in range(26)) + (
+    K.LEFT_BRACKET, K.BACKSLASH, K.RIGHT_BRACKET, _SHIFT | K.SIX, _SHIFT | K.MINUS, K.GRAVE_ACCENT,
+) + tuple(K.A + i for i in range(26)) + (
+    _SHIFT | K.LEFT_BRACKET, _SHIFT | K.BACKSLASH, _SHIFT | K.RIGHT_BRACKET, _SHIFT | K.GRAVE_ACCENT,
+)
+
+
+class KeyboardLayoutUS(object):
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+
+    def keycodes(self, char):
+        if char == "\n":
+            return (K.ENTER,)
+        if char == "\t":
+            return (K.TAB,)
+        code = ord(char) - 0x20
+        if code < 0 or code >= len(_ASCII):
+            raise ValueError("Unsupported character: %r" % char)
+        keycode = _ASCII[code]
+        if keycode & _SHIFT:
+            return (K.LEFT_SHIFT, keycode & ~_SHIFT)
+        return (keycode,)
+
+    def write(self, string, delay = None):
+        for char in string:
+            self.keyboard.press(*self.keycodes(char))
+            self.keyboard.release_all()
@@ -0,0 +1,14 @@
+from sim import hardware as hw
+
+
+class AnalogIn(object):
+    def __init__(self, pin):
+        self.pin = pin
+        self.reference_voltage = 3.3
+
+    @property
+    def value(self):
+        return hw.hardware.read_adc(self.pin.name)
+
+    def deinit(self):
+        pass
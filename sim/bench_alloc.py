@@ -0,0 +1,99 @@
+import os
+import sys
+import tracemalloc
+
+import sim
+from common import VirtualClock
+
+# python -m sim.bench_alloc [pico70|pi5]
+# the firmware's own keyboard_scan, mouse_scan and hid_writer tasks on the virtual clock, keys going up and down
+# and the stick pushed the whole time, with the heap measured around a window of their steps. CPython's
+# tracemalloc only sees memory still held at the end, so this catches leaks and growing buffers, not the short
+# lived ints MicroPython would allocate, for those run the same tasks on the board with gc.mem_free().
+BOARDS = ("pico70", "pi5")
+WARMUP_MS = 500
+WINDOW_MS = 2000
+
+
+def counted(task, name, func = None, counter = None, kwargs = {}):
+    # the firmware task itself, each of its steps counted
+    steps = func(task, name, **kwargs)
+    while True:
+        condition = next(steps)
+        counter[0] += 1
+        yield condition
+
+
+def typist(task, name, keys = (), joystick_pin = None, interval = 20):
+    # a key changes every interval ms and the stick flips direction every tenth one
+    hardware = sim.hw.hardware
+    n = 0
+    while True:
+        y, x = keys[n % len(keys)]
+        if hardware.matrix.is_down(y, x):
+            hardware.matrix.release(y, x)
+        else:
+            hardware.matrix.press(y, x)
+        if n % 10 == 0:
+            hardware.set_adc(joystick_pin, 60000 if n % 20 else 5000)
+        n += 1
+        yield task.sleep(interval)
+
+
+def probe(task, name, scheduler = None, counter = None, result = None):
+    yield task.sleep(WARMUP_MS)
+    result[0] = scheduler.mem_free()
+    result[2] = counter[0]
+    yield task.sleep(WINDOW_MS)
+    result[1] = scheduler.mem_free()
+    result[3] = counter[0]
+    scheduler.stop = True
+
+
+def run(board):
+    hardware = sim.install(board, VirtualClock())
+    fw = sim.load_firmware("code.py")
+    config = fw.load_board(fw.config_path)
+    joystick_pin = getattr(sys.modules["board"], config.joystick[0]).name # A0 is an alias of GP26
+    keys = [(1, 1), (2, 2), (3, 3)]
+    counter = [0]
+    result = [0, 0, 0, 0]
+    hardware.hid.keep = False # the report log is the simulation's memory, not the firmware's
+    s = fw.Scheluder(name = "bench", pool_size = 32)
+    writer = fw.HidWriter(fw.HidOutput(fw.usb_hid.devices))
+    writer_id = s.add_task(fw.Task(fw.hid_writer, "hid", kwargs = {"writer": writer}, mailbox_size = 64))
+    for func, name in ((fw.keyboard_scan, "keyboard"), (fw.mouse_scan, "mouse")):
+        kwargs = {"func": func, "counter": counter, "kwargs": {"config": config, "writer_id": writer_id}}
+        s.add_task(fw.Task(counted, name, kwargs = kwargs))
+    s.add_task(fw.Task(typist, "typist", kwargs = {"keys": keys, "joystick_pin": joystick_pin}))
+    s.add_task(fw.Task(probe, "probe", kwargs = {"scheduler": s, "counter": counter, "result": result}))
+    tracemalloc.start()
+    try:
+        s.run()
+    finally:
+        tracemalloc.stop()
+        sim.uninstall()
+    steps = result[3] - result[2]
+    return (result[0] - result[1]) // (steps if steps > 0 else 1), steps, s.msg_pool.misses
+
+
+def main(argv):
+    boards = [a for a in argv[1:] if a in BOARDS] or BOARDS
+    stdout = sys.stdout
+    failed = False
+    print("%-7s %6s %15s %11s %6s" % ("board", "steps", "bytes_per_step", "pool_misses", "check"))
+    for board in boards:
+        sys.stdout = open(os.devnull, "w") # the firmware's boot prints
+        try:
+            allocated, steps, misses = run(board)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        ok = allocated <= 0
+        failed = failed or not ok
+        print("%-7s %6d %15d %11d %6s" % (board, steps, allocated, misses, "PASS" if ok else "FAIL"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
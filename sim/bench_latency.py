@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+
+import sim
+from common import VirtualClock
+
+# python -m sim.bench_latency [pico70|pi5] [--wall] [--save]
+# scripted key taps and joystick pushes go through the firmware's own keyboard_scan, mouse_scan and hid_writer
+# tasks, each is matched with the HID report it produced. --wall runs on the host's clock so the firmware's
+# processing time counts too, the default virtual clock measures scheduling delay alone and is deterministic,
+# which is what the stored baseline is kept for. --save replaces the baseline with this run.
+BOARDS = ("pico70", "pi5")
+LOADS = ("none", "busy", "flood")
+KINDS = ("key_down", "key_up", "move")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency_baseline.json")
+TOLERANCE = 1.1 # a percentile regresses past 10% over the baseline, plus SLACK_MS
+SLACK_MS = 0.1
+TAPS = 36
+IDLE_EVERY = 12 # a pause past the keyboard's quiet_ms, so taps out of idle are measured too
+MOVES = 6
+ADC_PUSH = 60000
+MOVE_GAP_US = 100000 # motion reports further apart than this start a new move, no report marks the stop
+
+
+class Random(object):
+    # small lcg so every run injects the same script
+    def __init__(self, seed = 1):
+        self.state = seed
+
+    def next(self, low, high):
+        self.state = (self.state * 1103515245 + 12345) & 0x7FFFFFFF
+        return low + self.state % (high - low + 1)
+
+
+def tap_keys(keymap, count = 8):
+    # (y, x, keycode) of plain base layer keys, modifiers and mouse keys left out since they show elsewhere in the reports
+    keys = []
+    table = keymap.tables[0]
+    for i in range(len(table)):
+        action = table[i]
+        if 4 <= action < 0xE0 and not 200 <= action <= 204:
+            keys.append((i % keymap.rows, i // keymap.rows, action))
+            if len(keys) == count:
+                break
+    return keys
+
+
+def make_script(keys, joystick_pin):
+    # (at ms, action, args), rollover included: the next key can go down before the last one is up
+    rnd = Random()
+    script = []
+    at = 500 # past the firmware's boot
+    for n in range(TAPS):
+        y, x, keycode = keys[n % len(keys)]
+        hold = rnd.next(20, 90)
+        script.append((at, "press", (y, x, keycode)))
+        script.append((at + hold, "release", (y, x, keycode)))
+        at += rnd.next(30, 150) if (n + 1) % IDLE_EVERY else 2500
+    for n in range(MOVES):
+        script.append((at, "push", (joystick_pin, ADC_PUSH)))
+        script.append((at + 200, "center", (joystick_pin, sim.hardware.ADC_CENTER)))
+        at += rnd.next(400, 1200)
+    script.sort(key = lambda step: step[0])
+    return script, at + 300
+
+
+def burn(us):
+    # cpu time taken by a busy task, the virtual clock only moves when told to
+    clock = sim.hw.hardware.clock
+    if clock.virtual:
+        clock.virtual.advance(us / 1000.0)
+        return
+    end = time.perf_counter() + us / 1000000.0
+    while time.perf_counter() < end:
+        pass
+
+
+def busy(task, name, burn_us = 300, interval = 1):
+    while True:
+        burn(burn_us)
+        yield task.sleep(interval)
+
+
+def flooder(task, name, scheduler = None, receiver = None, count = 16):
+    msgs = [None] * count
+    n = 0
+    while True:
+        for i in range(count):
+            msgs[i] = scheduler.message(n, receiver)
+            n += 1
+        yield task.sleep(1, msgs)
+
+
+def sink(task, name):
+    while True:
+        yield task.wait()
+        while task.has_message():
+            task.get_message().release()
+
+
+def player(task, name, scheduler = None, script = (), end = 0, injected = None):
+    hardware = sim.hw.hardware
+    clock = hardware.clock
+    start = clock.now()
+    for at, action, args in script:
+        wait = at - (clock.now() - start)
+        yield task.sleep(wait if wait > 0 else 0)
+        if action == "press":
+            hardware.matrix.press(args[0], args[1])
+            injected.append((clock.now_us(), "key_down", args[2]))
+        elif action == "release":
+            hardware.matrix.release(args[0], args[1])
+            injected.append((clock.now_us(), "key_up", args[2]))
+        elif action == "push":
+            hardware.set_adc(args[0], args[1])
+            injected.append((clock.now_us(), "move", 0))
+        else:
+            hardware.set_adc(args[0], args[1])
+    wait = end - (clock.now() - start)
+    yield task.sleep(wait if wait > 0 else 0)
+    scheduler.stop = True
+
+
+def observed(reports):
+    # (us, kind, keycode) of every key change and motion onset seen in the HID reports, in report order
+    events = []
+    down = set()
+    moved_at = None
+    for ticks, device, report, us in reports:
+        if device == "keyboard":
+            now = set(b for b in report[2:] if b)
+            for keycode in report[2:]:
+                if keycode and keycode not in down:
+                    events.append((us, "key_down", keycode))
+            for keycode in down - now:
+                events.append((us, "key_up", keycode))
+            down = now
+        elif device == "mouse":
+            if report[1] or report[2]:
+                if moved_at is None or us - moved_at > MOVE_GAP_US:
+                    events.append((us, "move", 0))
+                moved_at = us
+    return events
+
+
+def match(injected, seen):
+    # the n-th injection of a (kind, keycode) is the n-th time the reports show it, unmatched ones are dropped,
+    # and an injection reported before the one injected ahead of it is reordered
+    latencies = dict((kind, []) for kind in KINDS)
+    dropped = dict((kind, 0) for kind in KINDS)
+    reordered = dict((kind, 0) for kind in KINDS)
+    queues = {}
+    for us, kind, keycode in seen:
+        queues.setdefault((kind, keycode), []).append(us)
+    last = {}
+    for us, kind, keycode in injected:
+        queue = queues.get((kind, keycode))
+        while queue and queue[0] < us: # a report from before the injection belongs to an earlier one
+            queue.pop(0)
+        if not queue:
+            dropped[kind] += 1
+            continue
+        at = queue.pop(0)
+        latencies[kind].append((at - us) / 1000.0)
+        if kind in last and at < last[kind]:
+            reordered[kind] += 1
+        last[kind] = at
+    return latencies, dropped, reordered
+
+
+def percentile(values, p):
+    # nearest rank
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = (len(values) * p + 99) // 100
+    return values[rank - 1 if rank > 0 else 0]
+
+
+def run(board, load, wall = False):
+    hardware = sim.install(board, None if wall else VirtualClock())
+    fw = sim.load_firmware("code.py")
+    config = fw.load_board(fw.config_path)
+    joystick_pin = getattr(sys.modules["board"], config.joystick[0]).name # A0 is an alias of GP26
+    script, end = make_script(tap_keys(config.keymap), joystick_pin)
+    injected = []
+    s = fw.Scheluder(name = "bench", pool_size = 32)
+    writer = fw.HidWriter(fw.HidOutput(fw.usb_hid.devices))
+    writer_id = s.add_task(fw.Task(fw.hid_writer, "hid", kwargs = {"writer": writer}, mailbox_size = 64))
+    s.add_task(fw.Task(fw.keyboard_scan, "keyboard", kwargs = {"config": config, "writer_id": writer_id}))
+    s.add_task(fw.Task(fw.mouse_scan, "mouse", kwargs = {"config": config, "writer_id": writer_id}))
+    if load == "busy":
+        for i in range(3):
+            s.add_task(fw.Task(busy, "busy-%d" % i))
+    elif load == "flood":
+        sink_id = s.add_task(fw.Task(sink, "sink", mailbox_size = 64))
+        s.add_task(fw.Task(flooder, "flood", kwargs = {"scheduler": s, "receiver": sink_id}))
+    s.add_task(fw.Task(player, "player", kwargs = {"scheduler": s, "script": script, "end": end, "injected": injected}))
+    hardware.hid.clear()
+    s.run()
+    sim.uninstall()
+    return match(injected, observed(hardware.hid.reports))
+
+
+def summary(latencies, dropped, reordered):
+    results = {}
+    for kind in KINDS:
+        values = latencies[kind]
+        results[kind] = {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else 0.0,
+            "dropped": dropped[kind],
+            "reordered": reordered[kind],
+        }
+    return results
+
+
+def regressions(key, result, baseline):
+    found = []
+    for field in ("p50", "p95", "p99", "max"):
+        if result[field] > baseline[field] * TOLERANCE + SLACK_MS:
+            found.append("%s %s %.2f ms > %.2f ms" % (key, field, result[field], baseline[field]))
+    for field in ("dropped", "reordered"):
+        if result[field] > baseline[field]:
+            found.append("%s %s %d > %d" % (key, field, result[field], baseline[field]))
+    return found
+
+
+def main(argv):
+    wall = "--wall" in argv
+    save = "--save" in argv
+    boards = [a for a in argv[1:] if a in BOARDS] or BOARDS
+    stdout = sys.stdout
+    results = {}
+    print("%-7s %-6s %-9s %4s %8s %8s %8s %8s %8s %10s" % ("board", "load", "event", "n", "p50_ms", "p95_ms", "p99_ms", "max_ms", "dropped", "reordered"))
+    for board in boards:
+        for load in LOADS:
+            sys.stdout = open(os.devnull, "w") # the firmware's boot prints
+            try:
+                latencies, dropped, reordered = run(board, load, wall)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            for kind, r in summary(latencies, dropped, reordered).items():
+                results["%s/%s/%s" % (board, load, kind)] = r
+                print("%-7s %-6s %-9s %4d %8.2f %8.2f %8.2f %8.2f %8d %10d" % (board, load, kind, r["n"], r["p50"], r["p95"], r["p99"], r["max"], r["dropped"], r["reordered"]))
+    if wall:
+        print("wall clock run, not compared with the baseline")
+        return 0
+    if save:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent = 1, sort_keys = True)
+        print("baseline saved to %s" % BASELINE)
+        return 0
+    try:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    except OSError:
+        print("no baseline, run with --save to store one")
+        return 0
+    found = []
+    for key in sorted(results):
+        if key in baseline:
+            found += regressions(key, results[key], baseline[key])
+    for line in found:
+        print("REGRESSION " + line)
+    print("baseline: %s" % ("FAIL" if found else "PASS"))
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,64 @@
+import time
+
+import sim
+from common import VirtualClock
+
+# python -m sim.bench_scan
+BOARDS = ("pico70", "pi5")
+
+
+def parked(task, name):
+    while True:
+        yield task.wait()
+
+
+def make_keyboard(fw, unroll = False):
+    # the scanner's events are dropped, only the scan itself is measured
+    s = fw.Scheluder(name = "bench")
+    task = fw.Task(parked, "bench")
+    s.add_task(task)
+    return fw.CustomKeyBoard(fw.load_board(fw.config_path), fw.EventQueue(task, None), unroll = unroll)
+
+
+def drop_events(events):
+    for msg in events.msgs:
+        msg.release()
+    events.sent()
+
+
+def measure(k, hardware, scans, rounds = 5):
+    # best of rounds, the host's timer noise is larger than the differences measured
+    best = None
+    for _ in range(rounds):
+        hardware.gpio_reads = 0
+        hardware.gpio_writes = 0
+        t = time.perf_counter()
+        for _ in range(scans):
+            k.scan()
+            drop_events(k.events)
+        elapsed = time.perf_counter() - t
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1000000 / scans, hardware.gpio_writes / scans, hardware.gpio_reads / scans
+
+
+def main(scans = 2000):
+    print("%-8s %-9s %-8s %10s %12s %11s" % ("board", "scan", "keys", "us/scan", "writes/scan", "reads/scan"))
+    for board in BOARDS:
+        hardware = sim.install(board, VirtualClock())
+        fw = sim.load_firmware("code.py")
+        for mode, unroll in (("loop", False), ("unrolled", True)):
+            k = make_keyboard(fw, unroll)
+            for label, keys in (("idle", ()), ("3 held", ((1, 1), (2, 2), (3, 3)))):
+                hardware.matrix.release_all()
+                for y, x in keys:
+                    hardware.matrix.press(y, x)
+                k.scan()
+                drop_events(k.events)
+                us, writes, reads = measure(k, hardware, scans)
+                print("%-8s %-9s %-8s %10.1f %12.1f %11.1f" % (board, mode, label, us, writes, reads))
+        sim.uninstall()
+
+
+if __name__ == "__main__":
+    main()
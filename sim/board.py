@@ -0,0 +1,16 @@
+class Pin(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "board.%s" % self.name
+
+
+for _i in range(30):
+    globals()["GP%s" % _i] = Pin("GP%s" % _i)
+
+A0 = GP26
+A1 = GP27
+A2 = GP28
+A3 = GP29
+LED = GP25
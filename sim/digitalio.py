@@ -0,0 +1,69 @@
+from sim import hardware as hw
+
+
+class Direction(object):
+    INPUT = "input"
+    OUTPUT = "output"
+
+
+class Pull(object):
+    UP = "up"
+    DOWN = "down"
+
+
+class DriveMode(object):
+    PUSH_PULL = "push_pull"
+    OPEN_DRAIN = "open_drain"
+
+
+class DigitalInOut(object):
+    def __init__(self, pin):
+        self.pin = pin
+        self._direction = Direction.INPUT
+        self._pull = None
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        self._direction = direction
+        if direction == Direction.OUTPUT:
+            hw.hardware.outputs[self.pin.name] = False
+        else:
+            hw.hardware.outputs.pop(self.pin.name, None)
+
+    @property
+    def pull(self):
+        return self._pull
+
+    @pull.setter
+    def pull(self, pull):
+        self._pull = pull
+        hw.hardware.pulls[self.pin.name] = pull
+
+    @property
+    def value(self):
+        hw.hardware.gpio_reads += 1
+        if self._direction == Direction.OUTPUT:
+            return hw.hardware.outputs[self.pin.name]
+        return hw.hardware.read(self.pin.name)
+
+    @value.setter
+    def value(self, value):
+        if self._direction != Direction.OUTPUT:
+            raise AttributeError("Cannot set value when direction is input.")
+        hw.hardware.gpio_writes += 1
+        hw.hardware.outputs[self.pin.name] = bool(value)
+
+    def switch_to_output(self, value = False, drive_mode = DriveMode.PUSH_PULL):
+        self.direction = Direction.OUTPUT
+        self.value = value
+
+    def switch_to_input(self, pull = None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def deinit(self):
+        hw.hardware.outputs.pop(self.pin.name, None)
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+
+real_sleep = time.sleep
+
+BOARDS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "boards")
+
+TICKS_MAX = (1 << 29) - 1
+ADC_MAX = 65535
+ADC_CENTER = 32768
+
+
+class SimulationEnd(SystemExit):
+    # not an Exception so the firmware's "except Exception" handlers let it through,
+    # a SystemExit so the core 1 scheduler's thread ends on it quietly
+    pass
+
+
+class Clock(object):
+    # time source installed with common.set_clock(): wall time, or a common.VirtualClock to fast-forward
+    def __init__(self, virtual = None):
+        self.virtual = virtual
+        self.start = time.monotonic()
+        self.deadline = None
+
+    def now(self):
+        if self.virtual:
+            return self.virtual.now_ms()
+        return int((time.monotonic() - self.start) * 1000)
+
+    def now_us(self):
+        # unwrapped microseconds, for timestamps compared on the host
+        if self.virtual:
+            return self.virtual.us
+        return int((time.monotonic() - self.start) * 1000000)
+
+    def ticks_ms(self):
+        now = self.now()
+        if self.deadline is not None and now >= self.deadline:
+            raise SimulationEnd()
+        return now & TICKS_MAX
+
+    def ticks_us(self):
+        if self.virtual:
+            return self.virtual.ticks_us()
+        return int((time.monotonic() - self.start) * 1000000) & TICKS_MAX
+
+    def sleep_ms(self, t):
+        if self.virtual:
+            self.virtual.sleep_ms(t)
+        else:
+            real_sleep(t / 1000.0)
+
+
+class KeyMatrix(object):
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.column_index = {}
+        self.row_index = {}
+        for i in range(len(columns)):
+            self.column_index[columns[i]] = i
+        for i in range(len(rows)):
+            self.row_index[rows[i]] = i
+        self.down = set()
+
+    def press(self, y, x):
+        self.down.add((y, x))
+
+    def release(self, y, x):
+        self.down.discard((y, x))
+
+    def release_all(self):
+        self.down.clear()
+
+    def is_down(self, y, x):
+        return (y, x) in self.down
+
+    def read_row(self, pin_name, outputs):
+        # a row reads low when a pressed key connects it to a column driven low
+        y = self.row_index[pin_name]
+        for (ky, kx) in self.down:
+            if ky == y and outputs.get(self.columns[kx]) is False:
+                return False
+        return True
+
+
+class HidLog(object):
+    def __init__(self):
+        self.reports = [] # (ticks_ms, device name, report bytes, clock us)
+        self.fail = 0 # the next sends raise, like a host that stopped taking reports
+        self.keep = True # False drops sent reports, for benches that only need the firmware to send them
+
+    def send(self, device, report):
+        if self.fail > 0:
+            self.fail -= 1
+            raise OSError("USB busy")
+        if self.keep:
+            self.record(device, report)
+
+    def record(self, device, report):
+        self.reports.append((hardware.clock.now() & TICKS_MAX, device, bytes(report), hardware.clock.now_us()))
+
+    def clear(self):
+        self.reports = []
+
+    def of(self, device):
+        return [r for r in self.reports if r[1] == device]
+
+    def last(self, device):
+        reports = self.of(device)
+        return reports[-1][2] if reports else None
+
+
+class Hardware(object):
+    def __init__(self, board = "pico70", virtual = None):
+        self.board = board
+        self.clock = Clock(virtual)
+        self.outputs = {} # pin name -> driven value
+        self.pulls = {} # pin name -> "up" / "down"
+        self.buttons = set() # standalone buttons held down (wired to ground)
+        self.adc = {}
+        self.pwm = {}
+        self.hid = HidLog()
+        self.usb_connected = True # supervisor.runtime.usb_connected, False until the host configures the device
+        self.gpio_reads = 0
+        self.gpio_writes = 0
+        with open(os.path.join(BOARDS_DIR, board + ".json")) as f:
+            config = json.load(f) # column (driven) and row (read, pulled up) pins of the key matrix
+        self.matrix = KeyMatrix(config["columns"], config["rows"])
+
+    def read(self, pin_name):
+        if pin_name in self.matrix.row_index:
+            return self.matrix.read_row(pin_name, self.outputs)
+        if pin_name in self.buttons:
+            return False
+        if pin_name in self.outputs:
+            return self.outputs[pin_name]
+        return self.pulls.get(pin_name) != "down"
+
+    def press_button(self, pin_name):
+        self.buttons.add(pin_name)
+
+    def release_button(self, pin_name):
+        self.buttons.discard(pin_name)
+
+    def set_adc(self, pin_name, value):
+        self.adc[pin_name] = value
+
+    def read_adc(self, pin_name):
+        return self.adc.get(pin_name, ADC_CENTER)
+
+
+hardware = Hardware()
+
+
+def reset(board = "pico70", virtual = None):
+    global hardware
+    hardware = Hardware(board, virtual)
+    return hardware
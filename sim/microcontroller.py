@@ -0,0 +1,6 @@
+class Processor(object):
+    frequency = 125000000
+    temperature = 27.0
+
+
+cpu = Processor()
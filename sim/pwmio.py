@@ -0,0 +1,19 @@
+from sim import hardware as hw
+
+
+class PWMOut(object):
+    def __init__(self, pin, duty_cycle = 0, frequency = 500, variable_frequency = False):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = duty_cycle
+
+    @property
+    def duty_cycle(self):
+        return hw.hardware.pwm[self.pin.name]
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        hw.hardware.pwm[self.pin.name] = value
+
+    def deinit(self):
+        pass
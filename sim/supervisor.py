@@ -0,0 +1,16 @@
+from sim import hardware as hw
+
+
+class Runtime(object):
+    serial_connected = True
+
+    @property
+    def usb_connected(self):
+        return hw.hardware.usb_connected
+
+
+runtime = Runtime()
+
+
+def ticks_ms():
+    return hw.hardware.clock.ticks_ms()
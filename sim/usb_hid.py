@@ -0,0 +1,19 @@
+from sim import hardware as hw
+
+
+class Device(object):
+    def __init__(self, name, usage_page, usage, report_length):
+        self.name = name
+        self.usage_page = usage_page
+        self.usage = usage
+        self.report_length = report_length
+
+    def send_report(self, report, report_id = None):
+        hw.hardware.hid.send(self.name, report)
+
+
+Device.KEYBOARD = Device("keyboard", 0x01, 0x06, 8)
+Device.MOUSE = Device("mouse", 0x01, 0x02, 4)
+Device.CONSUMER_CONTROL = Device("consumer_control", 0x0C, 0x01, 2)
+
+devices = [Device.KEYBOARD, Device.MOUSE, Device.CONSUMER_CONTROL]